@@ -0,0 +1,194 @@
+"""冷数据归档：把过期的龙虎榜及明细按日期分区写入本地Parquet文件并从数据库删除"""
+
+import logging
+import os
+from datetime import date, timedelta
+from pathlib import Path
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Stock, TopList
+
+logger = logging.getLogger(__name__)
+
+PARTITION_COLUMN = 'date'
+PARTITION_PREFIX = f'{PARTITION_COLUMN}='
+
+# 归档文件中每行是一条明细，同时冗余对应龙虎榜记录的字段；没有明细的龙虎榜记录明细字段为空。
+# 日期由分区目录名提供，不写入文件
+COLUMNS = {
+    'top_list_id': 'id',
+    'date': 'date',
+    'stock_code': 'stock__code',
+    'stock_name': 'stock__name',
+    'reason': 'reason',
+    'price_change': 'price_change',
+    'turnover': 'turnover',
+    'total_buy': 'total_buy',
+    'total_sell': 'total_sell',
+    'net_amount': 'net_amount',
+    'trader_name': 'details__trader_name',
+    'trader_type': 'details__trader_type',
+    'amount': 'details__amount',
+    'proportion': 'details__proportion',
+}
+
+
+def _schema():
+    import pyarrow as pa
+
+    return pa.schema([
+        ('top_list_id', pa.int64()),
+        ('stock_code', pa.string()),
+        ('stock_name', pa.string()),
+        ('reason', pa.string()),
+        ('price_change', pa.decimal128(10, 2)),
+        ('turnover', pa.decimal128(10, 2)),
+        ('total_buy', pa.decimal128(20, 2)),
+        ('total_sell', pa.decimal128(20, 2)),
+        ('net_amount', pa.decimal128(20, 2)),
+        ('trader_name', pa.string()),
+        ('trader_type', pa.string()),
+        ('amount', pa.decimal128(20, 2)),
+        ('proportion', pa.decimal128(5, 2)),
+    ])
+
+
+def archive_root():
+    return Path(settings.ARCHIVE_ROOT) / 'top_list'
+
+
+def hot_horizon():
+    """数据库中保留的最早日期，早于该日期的数据可能已归档"""
+    return timezone.now().date() - timedelta(days=settings.ARCHIVE_AFTER_DAYS)
+
+
+def archive_date(day):
+    """归档某一交易日的数据，返回写入的行数"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    queryset = TopList.objects.filter(date=day)
+    rows = list(queryset.order_by('id').values_list(*COLUMNS.values()))
+    if not rows:
+        return 0
+
+    table = pa.Table.from_pylist([dict(zip(COLUMNS, row)) for row in rows], schema=_schema())
+    partition = archive_root() / f'{PARTITION_PREFIX}{day.isoformat()}'
+    partition.mkdir(parents=True, exist_ok=True)
+    # 文件名由记录ID范围决定，重复执行时覆盖而不是追加重复数据
+    path = partition / f'part-{rows[0][0]}-{rows[-1][0]}.parquet'
+    tmp_path = path.with_suffix('.tmp')
+    pq.write_table(table, tmp_path, compression='zstd')
+    os.replace(tmp_path, path)
+
+    with transaction.atomic():
+        queryset.delete()
+    return len(rows)
+
+
+def archive_cold_data():
+    """归档早于热数据期限的全部交易日"""
+    cutoff = hot_horizon()
+    days = TopList.objects.filter(date__lt=cutoff).values_list('date', flat=True).distinct().order_by('date')
+    total = 0
+    for day in days:
+        count = archive_date(day)
+        logger.info('archived %d rows for %s', count, day)
+        total += count
+    return total
+
+
+def _dataset():
+    """把全部日期分区组成一个数据集；目录名不是合法日期的分区跳过"""
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    from pyarrow.fs import LocalFileSystem
+
+    root = archive_root()
+    if not root.exists():
+        return None
+    paths = []
+    for entry in os.scandir(root):
+        if not entry.is_dir() or not entry.name.startswith(PARTITION_PREFIX):
+            continue
+        try:
+            day = date.fromisoformat(entry.name[len(PARTITION_PREFIX):])
+        except ValueError:
+            logger.warning('skipping unexpected archive directory %s', entry.path)
+            continue
+        paths.extend((day, str(path)) for path in Path(entry.path).glob('*.parquet'))
+    if not paths:
+        return None
+
+    partition_schema = pa.schema([(PARTITION_COLUMN, pa.date32())])
+    return ds.dataset(
+        [path for _, path in sorted(paths)],
+        schema=pa.unify_schemas([_schema(), partition_schema]),
+        format='parquet',
+        filesystem=LocalFileSystem(use_mmap=True),
+        partitioning=ds.partitioning(partition_schema, flavor='hive'),
+        partition_base_dir=str(root),
+    )
+
+
+def iter_archived(start_date, end_date=None, columns=None, filters=None):
+    """在一次扫描中读取归档数据：日期范围按分区裁剪文件，filters按行组统计和行过滤，只读取所需列"""
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+
+    dataset = _dataset()
+    if dataset is None:
+        return
+    expression = ds.field(PARTITION_COLUMN) >= start_date
+    if end_date is not None:
+        expression &= ds.field(PARTITION_COLUMN) <= end_date
+    if filters:
+        expression &= pq.filters_to_expression(filters)
+    for batch in dataset.to_batches(columns=columns, filter=expression):
+        yield batch.to_pylist()
+
+
+def read_archived(start_date, end_date=None, columns=None, filters=None):
+    """读取热数据期限之前的归档数据，查询范围未超出期限时直接返回空列表"""
+    if start_date >= hot_horizon():
+        return []
+    rows = []
+    for batch_rows in iter_archived(start_date, end_date, columns, filters):
+        rows.extend(batch_rows)
+    return rows
+
+
+def iter_archived_top_lists():
+    """按日期顺序重放全部归档数据，每条龙虎榜记录产出(记录, 明细列表)"""
+    stock_ids = dict(Stock.objects.values_list('code', 'id'))
+    current = None
+    for batch_rows in iter_archived(date.min):
+        for row in batch_rows:
+            # 文件按记录ID顺序写入，同一记录的各行相邻
+            if current is None or current[0].id != row['top_list_id']:
+                if current is not None and current[0].stock_id is not None:
+                    yield current
+                top_list = SimpleNamespace(
+                    id=row['top_list_id'],
+                    stock_id=stock_ids.get(row['stock_code']),
+                    date=row['date'],
+                    total_buy=row['total_buy'],
+                    total_sell=row['total_sell'],
+                    net_amount=row['net_amount'],
+                    turnover=row['turnover'],
+                )
+                if top_list.stock_id is None:
+                    logger.warning('archived top list %s refers to unknown stock', top_list.id)
+                current = (top_list, [])
+            if row['trader_name'] is not None:
+                current[1].append(SimpleNamespace(
+                    trader_name=row['trader_name'],
+                    trader_type=row['trader_type'],
+                    amount=row['amount'],
+                ))
+    if current is not None and current[0].stock_id is not None:
+        yield current
@@ -0,0 +1,120 @@
+"""带单飞锁和提前刷新的缓存装饰器，防止缓存同时过期时的击穿"""
+
+import asyncio
+import functools
+import math
+import random
+import time
+import uuid
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.core.cache import cache
+
+LOCK_SUFFIX = ':lock'
+
+# 仅当锁仍属于自己时才删除，避免重算超时后误删其他进程的锁
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def _envelope(value, timeout, delta):
+    return {'value': value, 'expires_at': time.time() + timeout, 'delta': delta}
+
+
+def _release_lock(lock_key, token):
+    client = getattr(cache, 'client', None)
+    if client is not None and hasattr(client, 'get_client'):
+        # django-redis：用Lua脚本原子地比较并删除
+        client.get_client(write=True).eval(
+            RELEASE_LOCK_SCRIPT, 1, client.make_key(lock_key), client.encode(token)
+        )
+    elif cache.get(lock_key) == token:
+        # 非Redis缓存（开发/测试环境）无法原子比较，尽力而为
+        cache.delete(lock_key)
+
+
+def _is_fresh(entry, beta):
+    """XFetch提前刷新：越接近过期、重算越慢，越可能提前触发刷新"""
+    if not isinstance(entry, dict) or 'expires_at' not in entry:
+        return False
+    jitter = -entry['delta'] * beta * math.log(1 - random.random())
+    return time.time() + jitter < entry['expires_at']
+
+
+def single_flight_cache(key_func, timeout, stale_timeout=60, lock_timeout=30, wait_timeout=5, beta=1.0):
+    """缓存函数返回值，同一时刻只允许一个进程重算。
+
+    缓存条目的实际存活时间为timeout + stale_timeout：逻辑过期后的这段时间内，
+    未拿到锁的请求直接使用旧值；没有旧值时最多等待wait_timeout秒，之后自行计算。
+    """
+    physical_timeout = timeout + stale_timeout
+
+    def decorator(func):
+        if iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                key = key_func(*args, **kwargs)
+                entry = await cache.aget(key)
+                if _is_fresh(entry, beta):
+                    return entry['value']
+
+                lock_key = key + LOCK_SUFFIX
+                token = uuid.uuid4().hex
+                if await cache.aadd(lock_key, token, lock_timeout):
+                    try:
+                        started = time.monotonic()
+                        value = await func(*args, **kwargs)
+                        delta = time.monotonic() - started
+                        await cache.aset(key, _envelope(value, timeout, delta), physical_timeout)
+                        return value
+                    finally:
+                        await sync_to_async(_release_lock)(lock_key, token)
+
+                if isinstance(entry, dict) and 'value' in entry:
+                    return entry['value']
+
+                deadline = time.monotonic() + wait_timeout
+                while time.monotonic() < deadline:
+                    await asyncio.sleep(0.05)
+                    entry = await cache.aget(key)
+                    if isinstance(entry, dict) and 'value' in entry:
+                        return entry['value']
+                return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = key_func(*args, **kwargs)
+            entry = cache.get(key)
+            if _is_fresh(entry, beta):
+                return entry['value']
+
+            lock_key = key + LOCK_SUFFIX
+            token = uuid.uuid4().hex
+            if cache.add(lock_key, token, lock_timeout):
+                try:
+                    started = time.monotonic()
+                    value = func(*args, **kwargs)
+                    delta = time.monotonic() - started
+                    cache.set(key, _envelope(value, timeout, delta), physical_timeout)
+                    return value
+                finally:
+                    _release_lock(lock_key, token)
+
+            # 其他进程正在重算：有旧值直接返回旧值，否则短暂等待
+            if isinstance(entry, dict) and 'value' in entry:
+                return entry['value']
+
+            deadline = time.monotonic() + wait_timeout
+            while time.monotonic() < deadline:
+                time.sleep(0.05)
+                entry = cache.get(key)
+                if isinstance(entry, dict) and 'value' in entry:
+                    return entry['value']
+            return func(*args, **kwargs)
+        return wrapper
+    return decorator
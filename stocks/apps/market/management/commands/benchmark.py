@@ -0,0 +1,115 @@
+import json
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+
+from stocks.apps.market.responses import dumps_arrow, dumps_json, dumps_msgpack
+from stocks.apps.market.search import SearchIndex
+
+# 各类进程启动时加载的模块：web进程加载URL配置，worker加载Celery应用和任务，
+# 爬虫子进程额外加载爬虫及其依赖
+PROCESS_PROFILES = {
+    'web': ['stocks.urls'],
+    'analytics': ['stocks.celery', 'stocks.apps.market.tasks'],
+    'crawl': ['stocks.celery', 'stocks.apps.market.tasks', 'stocks.apps.market.spiders', 'scrapy.crawler'],
+}
+
+PROFILE_SCRIPT = '''
+import resource, sys, time
+started = time.perf_counter()
+import django
+django.setup()
+import importlib
+for name in sys.argv[1:]:
+    importlib.import_module(name)
+elapsed = time.perf_counter() - started
+heavy = sorted(m for m in ('scrapy', 'selenium', 'twisted', 'pyarrow') if m in sys.modules)
+print(elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, ','.join(heavy) or '-')
+'''
+
+
+class Command(BaseCommand):
+    help = '市场模块性能基准测试'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=1000, help='每项查询的重复次数')
+        parser.add_argument('--profiles', action='store_true', help='测量各类进程的导入耗时和内存占用')
+
+    def handle(self, *args, **options):
+        if options['profiles']:
+            self.bench_process_profiles()
+            return
+        self.bench_search_index(options['repeat'])
+        self.bench_serialization(options['repeat'])
+
+    def report(self, name, value):
+        self.stdout.write(f'{name:<40}{value}')
+
+    def bench_search_index(self, repeat):
+        index = SearchIndex()
+        tracemalloc.start()
+        index.refresh()
+        _, peak = tracemalloc.get_traced_memory()
+        snapshot_size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        self.report('search.build_seconds', f'{index.build_seconds:.3f}')
+        self.report('search.memory_mb', f'{snapshot_size / 1024 / 1024:.2f}')
+        self.report('search.build_peak_mb', f'{peak / 1024 / 1024:.2f}')
+
+        for query in ('600', '银行', 'pa', '证券营业部'):
+            started = time.perf_counter()
+            for _ in range(repeat):
+                index.search(query)
+            elapsed = (time.perf_counter() - started) / repeat
+            self.report(f'search.query[{query}]_us', f'{elapsed * 1e6:.1f}')
+
+    def bench_serialization(self, repeat):
+        # 与trader_history响应结构相同的1000行数据
+        today = date.today()
+        rows = [
+            {
+                'top_list__date': today - timedelta(days=i % 90),
+                'top_list__stock__code': f'{600000 + i:06d}',
+                'top_list__stock__name': '浦发银行',
+                'trader_type': 'buy' if i % 2 else 'sell',
+                'amount': Decimal('12345678.90') + i,
+                'proportion': Decimal('12.34'),
+                'top_list__price_change': Decimal('-3.21'),
+            }
+            for i in range(1000)
+        ]
+        data = {'history': rows}
+        encoders = {
+            'django_json': lambda: json.dumps(data, cls=DjangoJSONEncoder).encode(),
+            'orjson': lambda: dumps_json(data),
+            'msgpack': lambda: dumps_msgpack(data),
+            'arrow': lambda: dumps_arrow(data, 'history'),
+        }
+        iterations = max(1, repeat // 10)
+        for name, encode in encoders.items():
+            size = len(encode())
+            started = time.perf_counter()
+            for _ in range(iterations):
+                encode()
+            elapsed = (time.perf_counter() - started) / iterations
+            self.report(f'serialize.{name}_ms', f'{elapsed * 1000:.3f} ({size} bytes)')
+
+    def bench_process_profiles(self):
+        # 每个档案在全新的解释器中测量，避免模块缓存互相影响
+        for profile, modules in PROCESS_PROFILES.items():
+            result = subprocess.run(
+                [sys.executable, '-c', PROFILE_SCRIPT, *modules],
+                capture_output=True, text=True, check=True, cwd=settings.BASE_DIR
+            )
+            elapsed, max_rss_kb, heavy = result.stdout.split()
+            self.report(f'profile.{profile}.import_seconds', f'{float(elapsed):.3f}')
+            self.report(f'profile.{profile}.max_rss_mb', f'{int(max_rss_kb) / 1024:.1f}')
+            self.report(f'profile.{profile}.heavy_modules', heavy)
@@ -0,0 +1,26 @@
+import json
+
+from django.core.management.base import BaseCommand
+from scrapy.crawler import CrawlerProcess
+
+from stocks.apps.market.spiders import TopListSpider
+
+
+class Command(BaseCommand):
+    help = '抓取龙虎榜数据，最后一行输出本次抓取的变化统计（JSON）'
+
+    def handle(self, *args, **options):
+        process = CrawlerProcess({
+            'USER_AGENT': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+        })
+        
+        crawler = process.create_crawler(TopListSpider)
+        process.crawl(crawler)
+        process.start()
+        
+        stats = {
+            key.split('/', 1)[1]: value
+            for key, value in crawler.stats.get_stats().items()
+            if key.startswith('toplist/')
+        }
+        self.stdout.write(json.dumps(stats))
@@ -87,4 +87,68 @@ class TraderAnalysis(models.Model):
         ]
 
     def __str__(self):
-        return self.trader_name
\ No newline at end of file
+        return self.trader_name
+
+class StockHistoryRollup(models.Model):
+    PERIOD_CHOICES = [
+        ('day', '日'),
+        ('week', '周'),
+        ('month', '月'),
+    ]
+
+    stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='history_rollups', verbose_name='股票')
+    period = models.CharField(max_length=5, choices=PERIOD_CHOICES, verbose_name='统计周期')
+    bucket_start = models.DateField(verbose_name='周期起始日期')
+    appearance_count = models.IntegerField(default=0, verbose_name='上榜次数')
+    total_buy = models.DecimalField(max_digits=20, decimal_places=2, default=0, verbose_name='累计买入')
+    total_sell = models.DecimalField(max_digits=20, decimal_places=2, default=0, verbose_name='累计卖出')
+    net_amount = models.DecimalField(max_digits=20, decimal_places=2, default=0, verbose_name='累计净额')
+    turnover_sum = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name='换手率合计')
+    top_traders = models.JSONField(default=list, verbose_name='净买入前列营业部')
+
+    class Meta:
+        verbose_name = '个股龙虎榜汇总'
+        verbose_name_plural = verbose_name
+        ordering = ['-bucket_start']
+        unique_together = [('stock', 'period', 'bucket_start')]
+
+    def __str__(self):
+        return f'{self.stock.name} - {self.period} - {self.bucket_start}'
+
+class StockTraderRollup(models.Model):
+    stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='trader_rollups', verbose_name='股票')
+    period = models.CharField(max_length=5, choices=StockHistoryRollup.PERIOD_CHOICES, verbose_name='统计周期')
+    bucket_start = models.DateField(verbose_name='周期起始日期')
+    trader_name = models.CharField(max_length=100, verbose_name='营业部名称')
+    buy_amount = models.DecimalField(max_digits=20, decimal_places=2, default=0, verbose_name='买入金额')
+    sell_amount = models.DecimalField(max_digits=20, decimal_places=2, default=0, verbose_name='卖出金额')
+    net_amount = models.DecimalField(max_digits=20, decimal_places=2, default=0, verbose_name='净额')
+
+    class Meta:
+        verbose_name = '个股营业部汇总'
+        verbose_name_plural = verbose_name
+        unique_together = [('stock', 'period', 'bucket_start', 'trader_name')]
+        indexes = [
+            models.Index(fields=['stock', 'period', 'bucket_start', '-net_amount']),
+        ]
+
+    def __str__(self):
+        return f'{self.stock.name} - {self.trader_name} - {self.bucket_start}'
+
+class CrawlFingerprint(models.Model):
+    date = models.DateField(verbose_name='交易日期')
+    # 为空表示整个列表页的指纹
+    stock_code = models.CharField(max_length=10, blank=True, verbose_name='股票代码')
+    # 同一股票同一天可能因不同原因多次上榜，每个原因对应列表中的一行
+    reason = models.CharField(max_length=100, blank=True, verbose_name='上榜原因')
+    row_hash = models.CharField(max_length=64, blank=True, verbose_name='列表行指纹')
+    detail_hash = models.CharField(max_length=64, blank=True, verbose_name='明细表指纹')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='更新时间')
+
+    class Meta:
+        verbose_name = '抓取内容指纹'
+        verbose_name_plural = verbose_name
+        unique_together = [('date', 'stock_code', 'reason')]
+
+    def __str__(self):
+        return f'{self.stock_code or "列表页"} - {self.date} - {self.reason}'
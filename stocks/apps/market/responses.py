@@ -0,0 +1,107 @@
+"""行情接口的响应序列化：orjson快速输出JSON，并按Accept协商msgpack或Arrow IPC格式"""
+
+from datetime import date, datetime
+from decimal import Decimal
+
+import orjson
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+JSON = 'application/json'
+MSGPACK = 'application/msgpack'
+ARROW = 'application/vnd.apache.arrow.stream'
+
+# 部分客户端使用非标准的msgpack媒体类型
+MEDIA_TYPES = {
+    JSON: JSON,
+    MSGPACK: MSGPACK,
+    'application/x-msgpack': MSGPACK,
+    ARROW: ARROW,
+}
+
+
+def _decimal(value):
+    if settings.MARKET_DECIMAL_FORMAT == 'string':
+        return f'{value:f}'
+    return float(value)
+
+
+def _json_default(obj):
+    if isinstance(obj, Decimal):
+        return _decimal(obj)
+    raise TypeError
+
+
+def _msgpack_default(obj):
+    if isinstance(obj, Decimal):
+        return _decimal(obj)
+    if isinstance(obj, (date, datetime)):
+        return obj.isoformat()
+    raise TypeError(f'Object of type {type(obj).__name__} is not msgpack serializable')
+
+
+def negotiate(request, tabular=False):
+    """根据Accept头选择响应格式，只有表格数据才提供Arrow格式。
+
+    按q值从高到低、同q值按出现顺序选择；q=0或无法解析的q值视为不接受。
+    Accept为空、为*/*或只包含不支持的类型时回退为JSON而不是返回406，
+    浏览器和未声明Accept的旧客户端因此仍能拿到结果。
+    """
+    accepted = []
+    for position, item in enumerate(request.headers.get('Accept', '').split(',')):
+        media_type, _, params = item.strip().partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        media_type = MEDIA_TYPES.get(media_type.strip().lower())
+        if media_type and quality > 0 and (tabular or media_type != ARROW):
+            accepted.append((-quality, position, media_type))
+    return min(accepted)[2] if accepted else JSON
+
+
+def dumps_json(data):
+    return orjson.dumps(data, default=_json_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def dumps_msgpack(data):
+    import msgpack
+
+    return msgpack.packb(data, default=_msgpack_default, use_bin_type=True)
+
+
+def dumps_arrow(data, rows_key):
+    import pyarrow as pa
+
+    table = pa.Table.from_pylist(data[rows_key])
+    # 行数据以外的字段放入schema元数据
+    extra = {key: value for key, value in data.items() if key != rows_key}
+    if extra:
+        table = table.replace_schema_metadata({'extra': dumps_json(extra)})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def market_response(request, data, rows_key=None, status=200):
+    """序列化行情数据；rows_key指明data中的行列表字段，用于Arrow格式输出。
+
+    无法满足Accept时以JSON响应，Content-Type标明实际格式，并带上Vary: Accept。
+    """
+    media_type = negotiate(request, tabular=rows_key is not None)
+    if media_type == MSGPACK:
+        content = dumps_msgpack(data)
+    elif media_type == ARROW:
+        content = dumps_arrow(data, rows_key)
+    else:
+        content = dumps_json(data)
+    response = HttpResponse(content, content_type=media_type, status=status)
+    patch_vary_headers(response, ['Accept'])
+    return response
+
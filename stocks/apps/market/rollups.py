@@ -0,0 +1,96 @@
+"""个股龙虎榜按日/周/月汇总，在数据入库时增量维护"""
+
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F
+
+from .models import StockHistoryRollup, StockTraderRollup, TopList
+
+PERIODS = [period for period, _ in StockHistoryRollup.PERIOD_CHOICES]
+TOP_TRADERS = 5
+
+
+def bucket_start(date, period):
+    if period == 'week':
+        return date - timedelta(days=date.weekday())
+    if period == 'month':
+        return date.replace(day=1)
+    return date
+
+
+def _trader_amounts(details):
+    amounts = defaultdict(lambda: [Decimal(0), Decimal(0)])
+    for detail in details:
+        index = 0 if detail.trader_type == 'buy' else 1
+        amounts[detail.trader_name][index] += Decimal(str(detail.amount))
+    return amounts
+
+
+def _refresh_top_traders(rollup):
+    top = StockTraderRollup.objects.filter(
+        stock_id=rollup.stock_id,
+        period=rollup.period,
+        bucket_start=rollup.bucket_start,
+        net_amount__gt=0
+    ).order_by('-net_amount').values('trader_name', 'net_amount')[:TOP_TRADERS]
+    rollup.top_traders = [
+        {'trader_name': row['trader_name'], 'net_amount': str(row['net_amount'])} for row in top
+    ]
+    rollup.save(update_fields=['top_traders'])
+
+
+def apply_top_list(top_list, details, sign=1):
+    """把一条龙虎榜记录及其明细计入各周期汇总；sign=-1时撤销之前计入的数据"""
+    sign = Decimal(sign)
+    amounts = _trader_amounts(details)
+
+    with transaction.atomic():
+        for period in PERIODS:
+            start = bucket_start(top_list.date, period)
+            rollup, _ = StockHistoryRollup.objects.select_for_update().get_or_create(
+                stock_id=top_list.stock_id, period=period, bucket_start=start
+            )
+            StockHistoryRollup.objects.filter(pk=rollup.pk).update(
+                appearance_count=F('appearance_count') + int(sign),
+                total_buy=F('total_buy') + sign * Decimal(str(top_list.total_buy)),
+                total_sell=F('total_sell') + sign * Decimal(str(top_list.total_sell)),
+                net_amount=F('net_amount') + sign * Decimal(str(top_list.net_amount)),
+                turnover_sum=F('turnover_sum') + sign * Decimal(str(top_list.turnover))
+            )
+
+            for trader_name, (buy, sell) in amounts.items():
+                trader_rollup, _ = StockTraderRollup.objects.get_or_create(
+                    stock_id=top_list.stock_id, period=period, bucket_start=start, trader_name=trader_name
+                )
+                StockTraderRollup.objects.filter(pk=trader_rollup.pk).update(
+                    buy_amount=F('buy_amount') + sign * buy,
+                    sell_amount=F('sell_amount') + sign * sell,
+                    net_amount=F('net_amount') + sign * (buy - sell)
+                )
+
+            if sign < 0:
+                StockTraderRollup.objects.filter(
+                    stock_id=top_list.stock_id, period=period, bucket_start=start,
+                    buy_amount=0, sell_amount=0
+                ).delete()
+                if StockHistoryRollup.objects.filter(pk=rollup.pk, appearance_count__lte=0).delete()[0]:
+                    continue
+
+            _refresh_top_traders(rollup)
+
+
+def rebuild_rollups():
+    """根据归档文件和数据库中的数据重建全部汇总，用于首次上线或修复数据"""
+    from .archive import iter_archived_top_lists
+
+    StockHistoryRollup.objects.all().delete()
+    StockTraderRollup.objects.all().delete()
+    # 归档数据都早于数据库中的热数据，先重放归档再重放数据库
+    for top_list, details in iter_archived_top_lists():
+        apply_top_list(top_list, details)
+    queryset = TopList.objects.prefetch_related('details').order_by('date', 'id')
+    for top_list in queryset.iterator(chunk_size=500):
+        apply_top_list(top_list, top_list.details.all())
@@ -0,0 +1,230 @@
+import heapq
+import logging
+import threading
+import time
+from array import array
+from bisect import bisect_left
+
+from django.core.cache import cache
+from django.db import connections
+
+from stocks.db_router import use_replica
+from .models import Stock, TopListDetail
+
+logger = logging.getLogger(__name__)
+
+# 数据版本号缓存键，爬虫写入新数据后递增，各进程据此判断索引是否需要重建
+DATA_GENERATION_KEY = 'market_data_generation'
+# 两次检查数据版本号之间的最小间隔（秒），避免每次搜索都访问Redis
+GENERATION_CHECK_INTERVAL = 30
+MAX_LIMIT = 50
+
+
+def get_data_generation():
+    return cache.get(DATA_GENERATION_KEY, 0)
+
+
+def bump_data_generation():
+    """数据写入后递增版本号，通知各进程刷新内存索引"""
+    try:
+        return cache.incr(DATA_GENERATION_KEY)
+    except ValueError:
+        cache.set(DATA_GENERATION_KEY, 1, None)
+        return 1
+
+
+def _pinyin_initials(text):
+    from pypinyin import Style, lazy_pinyin
+
+    return ''.join(
+        syllable[0] for syllable in lazy_pinyin(text, style=Style.FIRST_LETTER, errors='ignore') if syllable
+    ).lower()
+
+
+def _grams(text, n):
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+class _Snapshot:
+    """一次构建得到的只读索引，重建时整体替换，查询无需加锁"""
+
+    def __init__(self, stocks, traders):
+        self.stocks = stocks  # [(code, name, market)]
+        # 营业部按名称长度排序，倒排链的下标顺序即排名顺序，查询时可提前结束
+        self.traders = sorted(traders, key=lambda name: (len(name), name))
+        self.names = [name for _, name, _ in stocks]
+
+        # 股票代码：有序列表 + 二分查找做前缀匹配
+        self.codes = sorted((code, i) for i, (code, _, _) in enumerate(stocks))
+        self.code_keys = [code for code, _ in self.codes]
+
+        # 拼音首字母：同样做前缀匹配
+        self.initials = sorted((_pinyin_initials(name), i) for i, (_, name, _) in enumerate(stocks))
+        self.initial_keys = [key for key, _ in self.initials]
+
+        # 股票名称：单字和双字倒排索引，支持任意子串匹配
+        self.name_grams = self._build_grams(self.names, (1, 2))
+        # 营业部名称：双字倒排索引
+        self.trader_grams = self._build_grams(self.traders, (2,))
+
+    @staticmethod
+    def _build_grams(texts, sizes):
+        postings = {}
+        for i, text in enumerate(texts):
+            for n in sizes:
+                for gram in _grams(text, n):
+                    postings.setdefault(gram, array('I')).append(i)
+        return postings
+
+    @staticmethod
+    def _prefix(keys, pairs, prefix, limit):
+        start = bisect_left(keys, prefix)
+        result = []
+        for key, i in pairs[start:start + limit]:
+            if not key.startswith(prefix):
+                break
+            result.append(i)
+        return result
+
+    @staticmethod
+    def _substring(postings, texts, query, n, limit=None):
+        """倒排链中的下标均为升序。limit为空时求各倒排链的交集后校验真实子串；
+        否则调用方保证下标顺序即排名顺序，沿最短的倒排链校验到limit条即停止"""
+        if len(query) < n:
+            chains = [postings.get(query, ())]
+        else:
+            chains = sorted((postings.get(g, ()) for g in _grams(query, n)), key=len)
+        if not chains or not chains[0]:
+            return []
+        if limit is None:
+            candidates = set(chains[0])
+            for chain in chains[1:]:
+                candidates.intersection_update(chain)
+                if not candidates:
+                    return []
+            return [i for i in candidates if query in texts[i]]
+        result = []
+        for i in chains[0]:
+            if query in texts[i]:
+                result.append(i)
+                if len(result) >= limit:
+                    break
+        return result
+
+    def search(self, query, limit):
+        query_lower = query.lower()
+        stock_hits = {}
+
+        if query.isdigit():
+            for i in self._prefix(self.code_keys, self.codes, query, limit):
+                stock_hits.setdefault(i, 0 if self.stocks[i][0] == query else 1)
+        elif query_lower.isascii() and query_lower.isalpha():
+            for i in self._prefix(self.initial_keys, self.initials, query_lower, limit):
+                stock_hits.setdefault(i, 2)
+
+        names = self.names
+        for i in self._substring(self.name_grams, names, query, 2):
+            stock_hits.setdefault(i, 1 if names[i].startswith(query) else 3)
+
+        ranked = heapq.nsmallest(
+            limit, stock_hits.items(), key=lambda item: (item[1], len(names[item[0]]), self.stocks[item[0]][0])
+        )
+        results = [
+            {'type': 'stock', 'code': self.stocks[i][0], 'name': self.stocks[i][1], 'market': self.stocks[i][2]}
+            for i, _ in ranked
+        ]
+
+        remaining = limit - len(results)
+        if remaining > 0 and len(query) >= 2:
+            trader_hits = self._substring(self.trader_grams, self.traders, query, 2, remaining)
+            results.extend({'type': 'trader', 'name': self.traders[i]} for i in trader_hits)
+
+        return results
+
+
+class SearchIndex:
+    """股票代码、名称及营业部名称的进程内搜索索引"""
+
+    def __init__(self):
+        self._snapshot = None
+        self._generation = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._refresh_thread = None
+        self.build_seconds = None
+
+    def build(self):
+        started = time.perf_counter()
+        with use_replica(sticky=False):
+            stocks = list(
+                Stock.objects.filter(is_active=True).order_by('code').values_list('code', 'name', 'market')
+            )
+            traders = list(
+                TopListDetail.objects.order_by('trader_name').values_list('trader_name', flat=True).distinct()
+            )
+        snapshot = _Snapshot(stocks, traders)
+        self.build_seconds = time.perf_counter() - started
+        return snapshot
+
+    def refresh(self):
+        generation = get_data_generation()
+        snapshot = self.build()
+        self._snapshot, self._generation = snapshot, generation
+        self._checked_at = time.monotonic()
+        logger.info('search index rebuilt: %d stocks, %d traders in %.3fs',
+                    len(snapshot.stocks), len(snapshot.traders), self.build_seconds)
+
+    def _refresh_in_background(self):
+        try:
+            self.refresh()
+        except Exception:
+            logger.exception('search index refresh failed')
+        finally:
+            self._lock.release()
+            # 后台线程有自己的数据库连接，结束前关闭
+            connections.close_all()
+
+    def ensure_fresh(self):
+        if self._snapshot is None:
+            # 首次构建只能等待
+            with self._lock:
+                if self._snapshot is None:
+                    self.refresh()
+            return
+        now = time.monotonic()
+        if now - self._checked_at < GENERATION_CHECK_INTERVAL:
+            return
+        # 其他线程正在检查或重建时继续使用旧索引
+        if not self._lock.acquire(blocking=False):
+            return
+        started = False
+        try:
+            self._checked_at = now
+            if get_data_generation() != self._generation:
+                # 在后台线程重建，当前请求及后续请求继续使用旧索引，重建完成后整体替换
+                self._refresh_thread = threading.Thread(
+                    target=self._refresh_in_background, name='search-index-refresh', daemon=True
+                )
+                self._refresh_thread.start()
+                started = True
+        finally:
+            if not started:
+                self._lock.release()
+
+    def search(self, query, limit=10):
+        query = query.strip()
+        if not query:
+            return []
+        self.ensure_fresh()
+        return self._snapshot.search(query, max(1, min(limit, MAX_LIMIT)))
+
+
+search_index = SearchIndex()
+
+
+def warm_up():
+    """在工作进程启动时预先构建索引，失败时留待首次查询再构建"""
+    try:
+        search_index.ensure_fresh()
+    except Exception:
+        logger.exception('search index warm-up failed')
@@ -1,13 +1,38 @@
+import copy
+import hashlib
+import logging
 import scrapy
-from scrapy.crawler import CrawlerProcess
+from collections import Counter, defaultdict
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from datetime import datetime, timedelta
+from datetime import datetime
+from decimal import Decimal
+from django.core.cache import cache
+from django.db import transaction
 from django.utils import timezone
-from celery import shared_task
-from .models import Stock, TopList, TopListDetail, TraderAnalysis
+from .models import CrawlFingerprint, Stock, TopList, TopListDetail
+from .rollups import apply_top_list
+
+logger = logging.getLogger(__name__)
+
+# 上次列表页响应的ETag/Last-Modified，用于条件请求
+HTTP_VALIDATORS_KEY = 'toplist_http_validators'
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def to_decimal(text):
+    return Decimal(text).quantize(Decimal('0.01'))
+
+
+def to_amount(text):
+    """页面金额以万元为单位，先换算成元再保留两位小数"""
+    return (Decimal(text) * 10000).quantize(Decimal('0.01'))
+
 
 class TopListSpider(scrapy.Spider):
     name = 'toplist'
@@ -16,9 +41,35 @@ class TopListSpider(scrapy.Spider):
     def start_requests(self):
         # 东方财富龙虎榜数据URL
         url = 'http://data.eastmoney.com/stock/tradedetail.html'
-        yield scrapy.Request(url=url, callback=self.parse)
+        validators = cache.get(HTTP_VALIDATORS_KEY) or {}
+        headers = {}
+        if validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        if validators.get('last_modified'):
+            headers['If-Modified-Since'] = validators['last_modified']
+        yield scrapy.Request(
+            url=url,
+            headers=headers,
+            callback=self.parse,
+            meta={'handle_httpstatus_list': [304]},
+            dont_filter=True
+        )
+    
+    def count(self, key):
+        self.crawler.stats.inc_value(f'toplist/{key}')
     
     def parse(self, response):
+        # 该URL只是静态页面框架，数据由页面脚本动态加载：304只说明框架未变，
+        # 数据是否变化仍以Selenium渲染后的内容指纹为准
+        validators = None
+        if response.status == 304:
+            self.count('not_modified')
+        else:
+            validators = {
+                'etag': response.headers.get('ETag', b'').decode(),
+                'last_modified': response.headers.get('Last-Modified', b'').decode(),
+            }
+        
         # 使用Selenium处理动态加载的数据
         options = webdriver.ChromeOptions()
         options.add_argument('--headless')
@@ -31,168 +82,182 @@ class TopListSpider(scrapy.Spider):
                 EC.presence_of_element_located((By.CLASS_NAME, 'table-list-tbody'))
             )
             
+            # 整个列表页内容未变化时直接跳过
+            page_hash = content_hash(driver.find_element(By.CLASS_NAME, 'table-list-tbody').text)
+            page_fingerprint, _ = CrawlFingerprint.objects.get_or_create(
+                date=timezone.now().date(), stock_code=''
+            )
+            if page_fingerprint.row_hash == page_hash:
+                logger.info('top list page content unchanged, skipping')
+                self.count('page_unchanged')
+                return
+            
             # 解析龙虎榜数据
             rows = driver.find_elements(By.CSS_SELECTOR, '.table-list-tbody tr')
-            for row in rows:
+            for index in range(len(rows)):
+                # 从明细页返回后需要重新获取行元素
+                row = driver.find_elements(By.CSS_SELECTOR, '.table-list-tbody tr')[index]
                 cells = row.find_elements(By.TAG_NAME, 'td')
                 if len(cells) < 10:
                     continue
                 
-                # 提取股票信息
-                stock_code = cells[1].text.strip()
-                stock_name = cells[2].text.strip()
-                market = 'SH' if stock_code.startswith('6') else 'SZ'
-                
-                # 保存或更新股票信息
-                stock, _ = Stock.objects.get_or_create(
-                    code=stock_code,
-                    defaults={
-                        'name': stock_name,
-                        'market': market
-                    }
-                )
-                
-                # 解析交易数据
-                date_str = cells[0].text.strip()
-                trade_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-                reason = cells[3].text.strip()
-                price_change = float(cells[4].text.strip().rstrip('%'))
-                turnover = float(cells[5].text.strip().rstrip('%'))
-                total_buy = float(cells[6].text.strip()) * 10000
-                total_sell = float(cells[7].text.strip()) * 10000
-                net_amount = total_buy - total_sell
-                
-                # 保存龙虎榜数据
-                top_list = TopList.objects.create(
-                    stock=stock,
-                    date=trade_date,
-                    reason=reason,
-                    total_buy=total_buy,
-                    total_sell=total_sell,
-                    net_amount=net_amount,
-                    turnover=turnover,
-                    price_change=price_change
-                )
-                
-                # 获取交易明细
-                detail_link = cells[9].find_element(By.TAG_NAME, 'a')
-                detail_link.click()
-                
-                # 等待明细数据加载
-                WebDriverWait(driver, 10).until(
-                    EC.presence_of_element_located((By.CLASS_NAME, 'detail-table'))
-                )
-                
-                # 解析买入明细
-                buy_rows = driver.find_elements(By.CSS_SELECTOR, '.detail-table:nth-child(1) tr')
-                for buy_row in buy_rows[1:]:
-                    buy_cells = buy_row.find_elements(By.TAG_NAME, 'td')
-                    if len(buy_cells) < 3:
-                        continue
-                    
-                    trader_name = buy_cells[0].text.strip()
-                    amount = float(buy_cells[1].text.strip()) * 10000
-                    proportion = float(buy_cells[2].text.strip().rstrip('%'))
-                    
-                    TopListDetail.objects.create(
-                        top_list=top_list,
-                        trader_name=trader_name,
-                        trader_type='buy',
-                        amount=amount,
-                        proportion=proportion
-                    )
-                
-                # 解析卖出明细
-                sell_rows = driver.find_elements(By.CSS_SELECTOR, '.detail-table:nth-child(2) tr')
-                for sell_row in sell_rows[1:]:
-                    sell_cells = sell_row.find_elements(By.TAG_NAME, 'td')
-                    if len(sell_cells) < 3:
-                        continue
-                    
-                    trader_name = sell_cells[0].text.strip()
-                    amount = float(sell_cells[1].text.strip()) * 10000
-                    proportion = float(sell_cells[2].text.strip().rstrip('%'))
-                    
-                    TopListDetail.objects.create(
-                        top_list=top_list,
-                        trader_name=trader_name,
-                        trader_type='sell',
-                        amount=amount,
-                        proportion=proportion
-                    )
-                
-                # 返回主列表
-                driver.back()
-                WebDriverWait(driver, 10).until(
-                    EC.presence_of_element_located((By.CLASS_NAME, 'table-list-tbody'))
-                )
+                if self.parse_row(driver, cells):
+                    self.count('changed')
+                else:
+                    self.count('unchanged')
+            
+            page_fingerprint.row_hash = page_hash
+            page_fingerprint.save(update_fields=['row_hash', 'updated_at'])
+            if validators is not None:
+                cache.set(HTTP_VALIDATORS_KEY, validators, None)
         
         finally:
             driver.quit()
-
-@shared_task
-def crawl_toplist_data():
-    """定时爬取龙虎榜数据的Celery任务"""
-    process = CrawlerProcess({
-        'USER_AGENT': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-    })
     
-    process.crawl(TopListSpider)
-    process.start()
-
-@shared_task
-def update_trader_analysis():
-    """更新游资交易数据分析的Celery任务"""
-    # 获取最近90天的数据进行分析
-    start_date = timezone.now().date() - timedelta(days=90)
-    
-    # 获取所有交易员的交易记录
-    traders = TopListDetail.objects.values('trader_name').distinct()
-    
-    for trader in traders:
-        trader_name = trader['trader_name']
-        
-        # 统计交易数据
-        buy_stats = TopListDetail.objects.filter(
-            trader_name=trader_name,
-            trader_type='buy',
-            top_list__date__gte=start_date
-        ).aggregate(
-            total_amount=models.Sum('amount'),
-            count=models.Count('id')
+    def parse_row(self, driver, cells):
+        """处理列表中的一行，内容有变化时返回True"""
+        texts = [cell.text.strip() for cell in cells[:9]]
+        stock_code = texts[1]
+        trade_date = datetime.strptime(texts[0], '%Y-%m-%d').date()
+        reason = texts[3]
+        row_hash = content_hash('\t'.join(texts))
+        
+        fingerprint, _ = CrawlFingerprint.objects.get_or_create(
+            date=trade_date, stock_code=stock_code, reason=reason
         )
+        if fingerprint.row_hash == row_hash and fingerprint.detail_hash:
+            return False
         
-        sell_stats = TopListDetail.objects.filter(
-            trader_name=trader_name,
-            trader_type='sell',
-            top_list__date__gte=start_date
-        ).aggregate(
-            total_amount=models.Sum('amount'),
-            count=models.Count('id')
+        # 获取交易明细
+        detail_link = cells[9].find_element(By.TAG_NAME, 'a')
+        detail_link.click()
+        
+        # 等待明细数据加载
+        WebDriverWait(driver, 10).until(
+            EC.presence_of_element_located((By.CLASS_NAME, 'detail-table'))
         )
         
-        # 计算成功率（以上涨为成功）
-        success_count = TopListDetail.objects.filter(
-            trader_name=trader_name,
-            top_list__date__gte=start_date,
-            top_list__price_change__gt=0
-        ).count()
+        detail_hash = content_hash('\n'.join(
+            table.text for table in driver.find_elements(By.CLASS_NAME, 'detail-table')
+        ))
+        details = None
+        if detail_hash != fingerprint.detail_hash or not TopList.objects.filter(
+            stock__code=stock_code, date=trade_date, reason=reason
+        ).exists():
+            details = self.parse_details(driver, '.detail-table:nth-child(1) tr', 'buy')
+            details += self.parse_details(driver, '.detail-table:nth-child(2) tr', 'sell')
         
-        total_count = TopListDetail.objects.filter(
-            trader_name=trader_name,
-            top_list__date__gte=start_date
-        ).count()
+        # 返回主列表
+        driver.back()
+        WebDriverWait(driver, 10).until(
+            EC.presence_of_element_located((By.CLASS_NAME, 'table-list-tbody'))
+        )
         
-        success_rate = (success_count / total_count * 100) if total_count > 0 else 0
+        with transaction.atomic():
+            self.save_row(texts, details)
+            fingerprint.row_hash = row_hash
+            fingerprint.detail_hash = detail_hash
+            fingerprint.save(update_fields=['row_hash', 'detail_hash', 'updated_at'])
+        return True
+    
+    def parse_details(self, driver, selector, trader_type):
+        details = []
+        for detail_row in driver.find_elements(By.CSS_SELECTOR, selector)[1:]:
+            detail_cells = detail_row.find_elements(By.TAG_NAME, 'td')
+            if len(detail_cells) < 3:
+                continue
+            
+            trader_name = detail_cells[0].text.strip()
+            amount = to_amount(detail_cells[1].text.strip())
+            proportion = to_decimal(detail_cells[2].text.strip().rstrip('%'))
+            details.append((trader_name, trader_type, amount, proportion))
+        return details
+    
+    def save_row(self, texts, details):
+        """保存一行龙虎榜数据，只写入有变化的字段和明细；details为None表示明细未变化"""
+        # 提取股票信息
+        stock_code = texts[1]
+        stock_name = texts[2]
+        market = 'SH' if stock_code.startswith('6') else 'SZ'
         
-        # 更新或创建分析记录
-        TraderAnalysis.objects.update_or_create(
-            trader_name=trader_name,
+        # 保存或更新股票信息
+        stock, _ = Stock.objects.get_or_create(
+            code=stock_code,
             defaults={
-                'total_buy_amount': buy_stats['total_amount'] or 0,
-                'total_sell_amount': sell_stats['total_amount'] or 0,
-                'net_amount': (buy_stats['total_amount'] or 0) - (sell_stats['total_amount'] or 0),
-                'success_rate': success_rate,
-                'appearance_count': total_count
+                'name': stock_name,
+                'market': market
             }
-        )
\ No newline at end of file
+        )
+        
+        # 解析交易数据
+        trade_date = datetime.strptime(texts[0], '%Y-%m-%d').date()
+        reason = texts[3]
+        total_buy = to_amount(texts[6])
+        total_sell = to_amount(texts[7])
+        fields = {
+            'price_change': to_decimal(texts[4].rstrip('%')),
+            'turnover': to_decimal(texts[5].rstrip('%')),
+            'total_buy': total_buy,
+            'total_sell': total_sell,
+            'net_amount': total_buy - total_sell,
+        }
+        
+        # 列表中的每一行对应一条龙虎榜记录，以股票、日期和上榜原因区分
+        top_list = TopList.objects.filter(stock=stock, date=trade_date, reason=reason).first()
+        if top_list is None:
+            top_list = TopList.objects.create(stock=stock, date=trade_date, reason=reason, **fields)
+            created = [
+                TopListDetail(
+                    top_list=top_list,
+                    trader_name=trader_name,
+                    trader_type=trader_type,
+                    amount=amount,
+                    proportion=proportion
+                )
+                for trader_name, trader_type, amount, proportion in details or []
+            ]
+            TopListDetail.objects.bulk_create(created)
+            # 增量更新个股历史汇总
+            apply_top_list(top_list, created)
+            return
+        
+        # 已有记录：先从汇总中撤销旧数据，写入差异后再计入新数据
+        old_top_list = copy.copy(top_list)
+        old_details = list(top_list.details.all())
+        
+        changed_fields = [name for name, value in fields.items() if getattr(top_list, name) != value]
+        if changed_fields:
+            for name in changed_fields:
+                setattr(top_list, name, fields[name])
+            top_list.save(update_fields=changed_fields)
+        
+        new_details = old_details
+        if details is not None:
+            # 按多重集比较：同一营业部（如机构专用）可能以相同金额出现多次，逐条保留或增删
+            wanted = Counter(details)
+            existing = defaultdict(list)
+            for d in old_details:
+                existing[(d.trader_name, d.trader_type, d.amount, d.proportion)].append(d)
+            kept, removed = [], []
+            for key, rows in existing.items():
+                kept.extend(rows[:wanted[key]])
+                removed.extend(d.id for d in rows[wanted[key]:])
+            added = []
+            for key, count in wanted.items():
+                trader_name, trader_type, amount, proportion = key
+                added.extend(
+                    TopListDetail(
+                        top_list=top_list,
+                        trader_name=trader_name,
+                        trader_type=trader_type,
+                        amount=amount,
+                        proportion=proportion
+                    )
+                    for _ in range(count - len(existing.get(key, ())))
+                )
+            TopListDetail.objects.filter(id__in=removed).delete()
+            TopListDetail.objects.bulk_create(added)
+            new_details = kept + added
+        
+        apply_top_list(old_top_list, old_details, sign=-1)
+        apply_top_list(top_list, new_details)
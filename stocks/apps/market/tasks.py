@@ -1,8 +1,114 @@
+import json
+import logging
+import subprocess
+import sys
+from datetime import timedelta
 from celery import shared_task
 from celery.schedules import crontab
 from django.conf import settings
 from django.core.cache import cache
-from .spiders import crawl_toplist_data, update_trader_analysis
+from django.db import models
+from django.utils import timezone
+from stocks.celery import app
+from stocks.db_router import use_replica
+from .archive import archive_cold_data
+from .models import TopListDetail, TraderAnalysis
+from .rollups import rebuild_rollups
+from .search import bump_data_generation
+
+logger = logging.getLogger(__name__)
+
+# 爬虫失败时记录的子进程stderr末尾字符数
+CRAWL_STDERR_TAIL = 4000
+
+# 注意：本模块会被所有Celery进程加载，不要在这里导入Scrapy、Selenium等爬虫依赖
+
+@shared_task
+def crawl_toplist_data():
+    """定时爬取龙虎榜数据的Celery任务
+
+    Twisted reactor无法在同一进程中重复启动，每次抓取都在新的子进程中执行
+    crawl_toplist管理命令，爬虫依赖也只在子进程中加载。
+    """
+    try:
+        result = subprocess.run(
+            [sys.executable, str(settings.BASE_DIR / 'manage.py'), 'crawl_toplist'],
+            capture_output=True,
+            text=True,
+            timeout=settings.CRAWL_TIMEOUT,
+            check=True
+        )
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as exc:
+        # Scrapy/Selenium的错误堆栈输出在子进程的stderr中，记录末尾部分便于排查
+        stderr = exc.stderr or ''
+        if isinstance(stderr, bytes):
+            stderr = stderr.decode(errors='replace')
+        logger.error('top list crawl failed: %s\n%s', exc, stderr[-CRAWL_STDERR_TAIL:])
+        raise
+    stats = json.loads(result.stdout.strip().splitlines()[-1])
+    logger.info('top list crawl finished: %s', stats)
+    if stats.get('changed'):
+        bump_data_generation()
+    return stats
+
+@shared_task
+def update_trader_analysis():
+    """更新游资交易数据分析的Celery任务"""
+    # 分析任务的读取走从库，写入仍走主库且不影响后续读取路由
+    with use_replica(sticky=False):
+        # 获取最近90天的数据进行分析
+        start_date = timezone.now().date() - timedelta(days=90)
+    
+        # 获取所有交易员的交易记录
+        traders = TopListDetail.objects.values('trader_name').distinct()
+    
+        for trader in traders:
+            trader_name = trader['trader_name']
+        
+            # 统计交易数据
+            buy_stats = TopListDetail.objects.filter(
+                trader_name=trader_name,
+                trader_type='buy',
+                top_list__date__gte=start_date
+            ).aggregate(
+                total_amount=models.Sum('amount'),
+                count=models.Count('id')
+            )
+        
+            sell_stats = TopListDetail.objects.filter(
+                trader_name=trader_name,
+                trader_type='sell',
+                top_list__date__gte=start_date
+            ).aggregate(
+                total_amount=models.Sum('amount'),
+                count=models.Count('id')
+            )
+        
+            # 计算成功率（以上涨为成功）
+            success_count = TopListDetail.objects.filter(
+                trader_name=trader_name,
+                top_list__date__gte=start_date,
+                top_list__price_change__gt=0
+            ).count()
+        
+            total_count = TopListDetail.objects.filter(
+                trader_name=trader_name,
+                top_list__date__gte=start_date
+            ).count()
+        
+            success_rate = (success_count / total_count * 100) if total_count > 0 else 0
+        
+            # 更新或创建分析记录
+            TraderAnalysis.objects.update_or_create(
+                trader_name=trader_name,
+                defaults={
+                    'total_buy_amount': buy_stats['total_amount'] or 0,
+                    'total_sell_amount': sell_stats['total_amount'] or 0,
+                    'net_amount': (buy_stats['total_amount'] or 0) - (sell_stats['total_amount'] or 0),
+                    'success_rate': success_rate,
+                    'appearance_count': total_count
+                }
+            )
 
 # 注册Celery定时任务
 @shared_task
@@ -15,6 +121,16 @@ def schedule_update_analysis():
     """每天凌晨更新游资交易数据分析"""
     update_trader_analysis()
 
+@shared_task
+def rebuild_stock_rollups():
+    """根据已有龙虎榜数据重建个股历史汇总"""
+    rebuild_rollups()
+
+@shared_task
+def archive_old_data():
+    """每天凌晨将过期的龙虎榜数据归档到Parquet文件"""
+    return archive_cold_data()
+
 # 配置定时任务
 app.conf.beat_schedule = {
     'crawl-toplist-data': {
@@ -25,4 +141,8 @@ app.conf.beat_schedule = {
         'task': 'stocks.apps.market.tasks.schedule_update_analysis',
         'schedule': crontab(hour=0, minute=30),  # 每天0:30执行
     },
+    'archive-old-data': {
+        'task': 'stocks.apps.market.tasks.archive_old_data',
+        'schedule': crontab(hour=2, minute=0),  # 每天2:00执行，在游资分析之后
+    },
 }
\ No newline at end of file
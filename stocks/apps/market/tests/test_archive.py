@@ -0,0 +1,133 @@
+import json
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.db import DatabaseError
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+
+from stocks.apps.market import archive, views
+from stocks.apps.market.archive import archive_date, archive_root, iter_archived_top_lists, read_archived
+from stocks.apps.market.models import Stock, StockHistoryRollup, StockTraderRollup, TopList, TopListDetail
+from stocks.apps.market.rollups import rebuild_rollups
+from stocks.apps.users.models import User
+from stocks.apps.users.views import generate_token
+
+
+@override_settings(ARCHIVE_AFTER_DAYS=30)
+class ArchiveTests(TestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        root = override_settings(ARCHIVE_ROOT=tmpdir.name)
+        root.enable()
+        self.addCleanup(root.disable)
+
+        self.today = timezone.now().date()
+        self.day = self.today - timedelta(days=60)
+        self.stock = Stock.objects.create(code='600000', name='浦发银行', market='SH')
+        self.top_list = self.create_top_list(self.stock, self.day)
+        self.create_detail(self.top_list, 'A营业部', 'buy', '800.00')
+        self.create_detail(self.top_list, 'B营业部', 'sell', '300.00')
+        # 没有明细的龙虎榜记录也要归档
+        self.create_top_list(Stock.objects.create(code='000001', name='平安银行', market='SZ'), self.day)
+
+    def create_top_list(self, stock, day):
+        return TopList.objects.create(
+            stock=stock, date=day, reason='涨幅偏离值达7%',
+            total_buy=Decimal('1000.00'), total_sell=Decimal('300.00'), net_amount=Decimal('700.00'),
+            turnover=Decimal('5.00'), price_change=Decimal('10.00')
+        )
+
+    def create_detail(self, top_list, trader_name, trader_type, amount):
+        return TopListDetail.objects.create(
+            top_list=top_list, trader_name=trader_name, trader_type=trader_type,
+            amount=Decimal(amount), proportion=Decimal('1.00')
+        )
+
+    def files(self):
+        return sorted(path.name for path in archive_root().glob('date=*/*.parquet'))
+
+    def test_archive_date_moves_rows_to_parquet(self):
+        self.assertEqual(archive_date(self.day), 3)
+
+        self.assertFalse(TopList.objects.filter(date=self.day).exists())
+        self.assertFalse(TopListDetail.objects.exists())
+        self.assertEqual(len(self.files()), 1)
+        self.assertEqual(len(read_archived(self.day)), 3)
+
+    def test_read_archived_prunes_columns_and_filters_trader(self):
+        archive_date(self.day)
+
+        rows = read_archived(
+            self.day - timedelta(days=10),
+            columns=['date', 'stock_code', 'amount'],
+            filters=[('trader_name', '=', 'A营业部')]
+        )
+
+        self.assertEqual(rows, [{'date': self.day, 'stock_code': '600000', 'amount': Decimal('800.00')}])
+        self.assertEqual(read_archived(self.day - timedelta(days=10), self.day - timedelta(days=1)), [])
+        # 查询范围未超出热数据期限时不读取归档
+        self.assertEqual(read_archived(self.today - timedelta(days=10)), [])
+
+    def test_unexpected_directories_are_skipped(self):
+        archive_date(self.day)
+        (archive_root() / 'date=garbage').mkdir()
+        (archive_root() / 'date=garbage' / 'part-1-2.parquet').write_bytes(b'not parquet')
+        (archive_root() / 'tmp').mkdir()
+
+        self.assertEqual(len(read_archived(self.day)), 3)
+
+    def test_rerun_overwrites_same_id_range(self):
+        # 文件已写入但删除数据库记录失败，重新执行时覆盖同一文件
+        with mock.patch.object(archive.transaction, 'atomic', side_effect=DatabaseError('boom')):
+            with self.assertRaises(DatabaseError):
+                archive_date(self.day)
+        self.assertTrue(TopList.objects.filter(date=self.day).exists())
+
+        self.assertEqual(archive_date(self.day), 3)
+
+        self.assertEqual(len(self.files()), 1)
+        self.assertEqual(len(read_archived(self.day)), 3)
+
+    def test_replay_and_rebuild_rollups_include_archived_rows(self):
+        hot = self.create_top_list(self.stock, self.today - timedelta(days=1))
+        self.create_detail(hot, 'A营业部', 'buy', '200.00')
+        archive_date(self.day)
+
+        replayed = [(top_list.date, top_list.stock_id, len(details)) for top_list, details in iter_archived_top_lists()]
+        self.assertEqual(sorted(replayed), [
+            (self.day, self.stock.id, 2), (self.day, Stock.objects.get(code='000001').id, 0),
+        ])
+
+        rebuild_rollups()
+
+        archived_day = StockHistoryRollup.objects.get(stock=self.stock, period='day', bucket_start=self.day)
+        self.assertEqual(archived_day.appearance_count, 1)
+        self.assertEqual(archived_day.total_buy, Decimal('1000.00'))
+        self.assertEqual(archived_day.top_traders, [{'trader_name': 'A营业部', 'net_amount': '800.00'}])
+        self.assertTrue(StockHistoryRollup.objects.filter(period='day', bucket_start=hot.date).exists())
+        self.assertEqual(
+            StockTraderRollup.objects.get(period='day', bucket_start=self.day, trader_name='B营业部').sell_amount,
+            Decimal('300.00')
+        )
+
+    @mock.patch('stocks.db_router.replica_available', return_value=False)
+    def test_trader_history_merges_archived_rows(self, _):
+        hot = self.create_top_list(self.stock, self.today - timedelta(days=1))
+        self.create_detail(hot, 'A营业部', 'buy', '200.00')
+        archive_date(self.day)
+        user = User.objects.create_user(username='vip', password='secret', is_vip=True)
+
+        request = RequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {generate_token(user)}')
+        response = views.trader_history(request, 'A营业部')
+
+        self.assertEqual(response.status_code, 200)
+        history = json.loads(response.content)['history']
+        self.assertEqual(
+            [(row['top_list__date'], row['amount']) for row in history],
+            [(hot.date.isoformat(), '200.00'), (self.day.isoformat(), '800.00')]
+        )
+        self.assertEqual(history[1]['top_list__stock__code'], '600000')
@@ -0,0 +1,63 @@
+import time
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from stocks.apps.market.caching import LOCK_SUFFIX, _release_lock, single_flight_cache
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class SingleFlightCacheTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.compute = mock.Mock(return_value='fresh')
+        self.cached = single_flight_cache(lambda key: key, timeout=60, wait_timeout=0.1)(self.compute)
+
+    def put(self, key, value, expires_in):
+        cache.set(key, {'value': value, 'expires_at': time.time() + expires_in, 'delta': 0}, 300)
+
+    def test_miss_computes_and_stores(self):
+        self.assertEqual(self.cached('k'), 'fresh')
+        self.assertEqual(cache.get('k')['value'], 'fresh')
+        self.assertIsNone(cache.get('k' + LOCK_SUFFIX))
+
+    def test_fresh_entry_is_served_without_recompute(self):
+        self.put('k', 'cached', 60)
+        self.assertEqual(self.cached('k'), 'cached')
+        self.compute.assert_not_called()
+
+    def test_expired_entry_is_recomputed_by_lock_holder(self):
+        self.put('k', 'old', -1)
+        self.assertEqual(self.cached('k'), 'fresh')
+        self.compute.assert_called_once()
+
+    def test_stale_entry_is_served_while_another_worker_recomputes(self):
+        self.put('k', 'old', -1)
+        cache.add('k' + LOCK_SUFFIX, 'other-worker', 30)
+        self.assertEqual(self.cached('k'), 'old')
+        self.compute.assert_not_called()
+
+    def test_waits_then_computes_when_lock_held_and_no_stale_value(self):
+        cache.add('k' + LOCK_SUFFIX, 'other-worker', 30)
+        self.assertEqual(self.cached('k'), 'fresh')
+        self.compute.assert_called_once()
+        # 锁仍属于其他进程，不应被删除
+        self.assertEqual(cache.get('k' + LOCK_SUFFIX), 'other-worker')
+
+    def test_release_keeps_lock_owned_by_another_worker(self):
+        cache.add('k' + LOCK_SUFFIX, 'other-worker', 30)
+        _release_lock('k' + LOCK_SUFFIX, 'mine')
+        self.assertEqual(cache.get('k' + LOCK_SUFFIX), 'other-worker')
+        _release_lock('k' + LOCK_SUFFIX, 'other-worker')
+        self.assertIsNone(cache.get('k' + LOCK_SUFFIX))
+
+    def test_async_function(self):
+        @single_flight_cache(lambda key: key, timeout=60)
+        async def compute(key):
+            return 'async'
+
+        self.assertEqual(async_to_sync(compute)('a'), 'async')
+        self.assertEqual(async_to_sync(compute)('a'), 'async')
+        self.assertEqual(cache.get('a')['value'], 'async')
@@ -0,0 +1,51 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from stocks.apps.market.models import Stock
+from stocks.db_router import PRIMARY_DB, REPLICA_DB, PrimaryReplicaRouter, use_primary, use_replica
+
+
+@mock.patch('stocks.db_router.replica_available', return_value=True)
+class PrimaryReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+
+    def test_reads_use_primary_by_default(self, _):
+        self.assertEqual(self.router.db_for_read(Stock), PRIMARY_DB)
+
+    def test_reads_use_replica_inside_context(self, _):
+        with use_replica():
+            self.assertEqual(self.router.db_for_read(Stock), REPLICA_DB)
+
+    def test_writes_use_primary(self, _):
+        with use_replica():
+            self.assertEqual(self.router.db_for_write(Stock), PRIMARY_DB)
+
+    def test_sticky_write_pins_later_reads_to_primary(self, _):
+        with use_replica():
+            self.router.db_for_write(Stock)
+            self.assertEqual(self.router.db_for_read(Stock), PRIMARY_DB)
+        # 离开上下文后固定状态被重置
+        with use_replica():
+            self.assertEqual(self.router.db_for_read(Stock), REPLICA_DB)
+
+    def test_non_sticky_write_keeps_reads_on_replica(self, _):
+        with use_replica(sticky=False):
+            self.router.db_for_write(Stock)
+            self.assertEqual(self.router.db_for_read(Stock), REPLICA_DB)
+
+    def test_use_primary_overrides_replica(self, _):
+        with use_replica():
+            with use_primary():
+                self.assertEqual(self.router.db_for_read(Stock), PRIMARY_DB)
+            self.assertEqual(self.router.db_for_read(Stock), REPLICA_DB)
+
+    def test_falls_back_to_primary_without_replica(self, replica_available):
+        replica_available.return_value = False
+        with use_replica():
+            self.assertEqual(self.router.db_for_read(Stock), PRIMARY_DB)
+
+    def test_migrations_only_on_primary(self, _):
+        self.assertTrue(self.router.allow_migrate(PRIMARY_DB, 'market'))
+        self.assertFalse(self.router.allow_migrate(REPLICA_DB, 'market'))
@@ -0,0 +1,87 @@
+import json
+from datetime import date
+from decimal import Decimal
+
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from stocks.apps.market.responses import ARROW, JSON, MSGPACK, market_response, negotiate
+
+DATA = {
+    'stock': '600000',
+    'history': [{'date': date(2024, 3, 11), 'amount': Decimal('1234.50')}],
+}
+
+
+class NegotiateTests(SimpleTestCase):
+    def negotiate(self, accept, tabular=False):
+        request = RequestFactory().get('/', HTTP_ACCEPT=accept) if accept is not None else RequestFactory().get('/')
+        return negotiate(request, tabular=tabular)
+
+    def test_highest_quality_wins(self):
+        self.assertEqual(self.negotiate('application/json;q=0.5, application/msgpack'), MSGPACK)
+        self.assertEqual(self.negotiate('application/msgpack;q=0.2, application/json;q=0.8'), JSON)
+
+    def test_equal_quality_uses_header_order(self):
+        self.assertEqual(self.negotiate('application/msgpack, application/json'), MSGPACK)
+        self.assertEqual(self.negotiate('application/json, application/msgpack'), JSON)
+
+    def test_zero_or_invalid_quality_is_not_acceptable(self):
+        self.assertEqual(self.negotiate('application/msgpack;q=0'), JSON)
+        self.assertEqual(self.negotiate('application/msgpack;q=abc'), JSON)
+
+    def test_msgpack_alias(self):
+        self.assertEqual(self.negotiate('application/x-msgpack'), MSGPACK)
+        self.assertEqual(self.negotiate('Application/X-MsgPack; q=0.9, text/html'), MSGPACK)
+
+    def test_arrow_only_for_tabular_data(self):
+        self.assertEqual(self.negotiate(ARROW, tabular=True), ARROW)
+        self.assertEqual(self.negotiate(ARROW), JSON)
+        self.assertEqual(self.negotiate(f'{ARROW}, application/msgpack;q=0.5'), MSGPACK)
+
+    def test_unsatisfiable_accept_falls_back_to_json(self):
+        self.assertEqual(self.negotiate(None), JSON)
+        self.assertEqual(self.negotiate('*/*'), JSON)
+        self.assertEqual(self.negotiate('text/html, application/xml;q=0.9'), JSON)
+
+
+class MarketResponseTests(SimpleTestCase):
+    def respond(self, accept, rows_key='history'):
+        request = RequestFactory().get('/', HTTP_ACCEPT=accept)
+        return market_response(request, DATA, rows_key=rows_key)
+
+    @override_settings(MARKET_DECIMAL_FORMAT='string')
+    def test_json_decimal_as_string(self):
+        response = self.respond(JSON)
+        self.assertEqual(response['Content-Type'], JSON)
+        self.assertIn('Accept', response['Vary'])
+        self.assertEqual(json.loads(response.content)['history'], [{'date': '2024-03-11', 'amount': '1234.50'}])
+
+    @override_settings(MARKET_DECIMAL_FORMAT='number')
+    def test_json_decimal_as_number(self):
+        self.assertEqual(json.loads(self.respond(JSON).content)['history'][0]['amount'], 1234.5)
+
+    @override_settings(MARKET_DECIMAL_FORMAT='string')
+    def test_msgpack(self):
+        import msgpack
+
+        response = self.respond('application/x-msgpack')
+        self.assertEqual(response['Content-Type'], MSGPACK)
+        self.assertEqual(msgpack.unpackb(response.content), {
+            'stock': '600000', 'history': [{'date': '2024-03-11', 'amount': '1234.50'}],
+        })
+        with self.settings(MARKET_DECIMAL_FORMAT='number'):
+            self.assertEqual(msgpack.unpackb(self.respond(MSGPACK).content)['history'][0]['amount'], 1234.5)
+
+    def test_arrow_for_tabular_endpoint(self):
+        import pyarrow as pa
+
+        response = self.respond(ARROW)
+        self.assertEqual(response['Content-Type'], ARROW)
+        table = pa.ipc.open_stream(response.content).read_all()
+        self.assertEqual(table.to_pylist(), DATA['history'])
+        self.assertEqual(json.loads(table.schema.metadata[b'extra']), {'stock': '600000'})
+
+    def test_arrow_falls_back_to_json_for_non_tabular_endpoint(self):
+        response = self.respond(ARROW, rows_key=None)
+        self.assertEqual(response['Content-Type'], JSON)
+        self.assertEqual(json.loads(response.content)['stock'], '600000')
@@ -0,0 +1,71 @@
+from datetime import date
+from decimal import Decimal
+
+from django.test import TestCase
+
+from stocks.apps.market.models import Stock, StockHistoryRollup, StockTraderRollup, TopList, TopListDetail
+from stocks.apps.market.rollups import apply_top_list, bucket_start
+
+
+class RollupTests(TestCase):
+    def setUp(self):
+        self.stock = Stock.objects.create(code='600000', name='浦发银行', market='SH')
+
+    def create_top_list(self, day, total_buy, total_sell, turnover='5.00'):
+        return TopList.objects.create(
+            stock=self.stock, date=day, reason='涨幅偏离值达7%',
+            total_buy=Decimal(total_buy), total_sell=Decimal(total_sell),
+            net_amount=Decimal(total_buy) - Decimal(total_sell),
+            turnover=Decimal(turnover), price_change=Decimal('10.00')
+        )
+
+    def create_detail(self, top_list, trader_name, trader_type, amount):
+        return TopListDetail.objects.create(
+            top_list=top_list, trader_name=trader_name, trader_type=trader_type,
+            amount=Decimal(amount), proportion=Decimal('1.00')
+        )
+
+    def rollup(self, period, day):
+        return StockHistoryRollup.objects.get(stock=self.stock, period=period, bucket_start=bucket_start(day, period))
+
+    def test_bucket_start(self):
+        day = date(2024, 3, 14)  # 周四
+        self.assertEqual(bucket_start(day, 'day'), day)
+        self.assertEqual(bucket_start(day, 'week'), date(2024, 3, 11))
+        self.assertEqual(bucket_start(day, 'month'), date(2024, 3, 1))
+
+    def test_apply_accumulates_into_all_periods(self):
+        first = self.create_top_list(date(2024, 3, 11), '1000.00', '400.00', '4.00')
+        second = self.create_top_list(date(2024, 3, 12), '500.00', '100.00', '6.00')
+        apply_top_list(first, [self.create_detail(first, 'A营业部', 'buy', '800.00')])
+        apply_top_list(second, [
+            self.create_detail(second, 'A营业部', 'buy', '300.00'),
+            self.create_detail(second, 'B营业部', 'sell', '100.00'),
+        ])
+
+        week = self.rollup('week', date(2024, 3, 11))
+        self.assertEqual(week.appearance_count, 2)
+        self.assertEqual(week.total_buy, Decimal('1500.00'))
+        self.assertEqual(week.total_sell, Decimal('500.00'))
+        self.assertEqual(week.net_amount, Decimal('1000.00'))
+        self.assertEqual(week.turnover_sum, Decimal('10.00'))
+        self.assertEqual(week.top_traders, [{'trader_name': 'A营业部', 'net_amount': '1100.00'}])
+        self.assertEqual(self.rollup('day', date(2024, 3, 12)).appearance_count, 1)
+
+    def test_retract_removes_contribution(self):
+        first = self.create_top_list(date(2024, 3, 11), '1000.00', '400.00')
+        second = self.create_top_list(date(2024, 3, 12), '500.00', '100.00')
+        first_details = [self.create_detail(first, 'A营业部', 'buy', '800.00')]
+        second_details = [self.create_detail(second, 'B营业部', 'buy', '200.00')]
+        apply_top_list(first, first_details)
+        apply_top_list(second, second_details)
+
+        apply_top_list(second, second_details, sign=-1)
+
+        week = self.rollup('week', date(2024, 3, 11))
+        self.assertEqual(week.appearance_count, 1)
+        self.assertEqual(week.total_buy, Decimal('1000.00'))
+        self.assertEqual(week.top_traders, [{'trader_name': 'A营业部', 'net_amount': '800.00'}])
+        self.assertFalse(StockTraderRollup.objects.filter(trader_name='B营业部').exists())
+        # 该日唯一的记录被撤销后，日汇总行被删除
+        self.assertFalse(StockHistoryRollup.objects.filter(period='day', bucket_start=date(2024, 3, 12)).exists())
@@ -0,0 +1,130 @@
+import threading
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from stocks.apps.market import search
+from stocks.apps.market.search import SearchIndex, _Snapshot
+
+INITIALS = {
+    '浦发银行': 'pfyh',
+    '招商银行': 'zsyh',
+    '平安银行': 'payh',
+    '中信证券': 'zxzq',
+    '银行ETF': 'yhetf',
+    '招商证券': 'zszq',
+    '兴业银行': 'xyyh',
+}
+STOCKS = [
+    ('000001', '平安银行', 'SZ'),
+    ('512800', '银行ETF', 'SH'),
+    ('600000', '浦发银行', 'SH'),
+    ('600030', '中信证券', 'SH'),
+    ('600036', '招商银行', 'SH'),
+    ('600999', '招商证券', 'SH'),
+]
+TRADERS = [
+    '机构专用',
+    '中信证券股份有限公司北京总部证券营业部',
+    '中信证券股份有限公司上海分公司',
+    '华泰证券股份有限公司南京中山东路证券营业部',
+]
+
+
+def make_snapshot(stocks=STOCKS, traders=TRADERS):
+    with mock.patch.object(search, '_pinyin_initials', side_effect=INITIALS.get):
+        return _Snapshot(stocks, traders)
+
+
+def names(results):
+    return [(item['type'], item.get('code', item['name'])) for item in results]
+
+
+class SnapshotSearchTests(SimpleTestCase):
+    def setUp(self):
+        self.snapshot = make_snapshot()
+
+    def test_exact_code_ranks_before_code_prefix(self):
+        self.assertEqual(names(self.snapshot.search('600030', 10))[0], ('stock', '600030'))
+        self.assertEqual(names(self.snapshot.search('6000', 10)), [
+            ('stock', '600000'), ('stock', '600030'), ('stock', '600036'),
+        ])
+
+    def test_pinyin_initials_prefix(self):
+        self.assertEqual(names(self.snapshot.search('zs', 10)), [('stock', '600036'), ('stock', '600999')])
+        self.assertEqual(names(self.snapshot.search('ZSYH', 10)), [('stock', '600036')])
+
+    def test_name_prefix_ranks_before_substring(self):
+        # 名称以查询串开头的排在前面，其余按名称长度和代码排序
+        self.assertEqual(names(self.snapshot.search('银行', 10)), [
+            ('stock', '512800'), ('stock', '000001'), ('stock', '600000'), ('stock', '600036'),
+        ])
+
+    def test_traders_fill_remaining_slots_by_name_length(self):
+        self.assertEqual(names(self.snapshot.search('中信证券', 10)), [
+            ('stock', '600030'),
+            ('trader', '中信证券股份有限公司上海分公司'),
+            ('trader', '中信证券股份有限公司北京总部证券营业部'),
+        ])
+        self.assertEqual(names(self.snapshot.search('中信证券', 2)), [
+            ('stock', '600030'), ('trader', '中信证券股份有限公司上海分公司'),
+        ])
+
+    def test_trader_match_requires_real_substring(self):
+        # 双字索引都命中但不是连续子串的营业部不应返回
+        self.assertEqual(names(self.snapshot.search('证券营业部', 10)), [
+            ('trader', '中信证券股份有限公司北京总部证券营业部'),
+            ('trader', '华泰证券股份有限公司南京中山东路证券营业部'),
+        ])
+        self.assertEqual(self.snapshot.search('中信证券营业部', 10), [])
+
+    def test_single_character_does_not_match_traders(self):
+        self.assertEqual(self.snapshot.search('机', 10), [])
+        self.assertEqual(names(self.snapshot.search('机构', 10)), [('trader', '机构专用')])
+
+
+class SearchIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.index = SearchIndex()
+        self.index.build_seconds = 0.0
+        patcher = mock.patch.object(search, 'get_data_generation', return_value=1)
+        self.generation = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_first_search_builds_synchronously(self):
+        with mock.patch.object(self.index, 'build', return_value=make_snapshot()) as build:
+            self.assertEqual(names(self.index.search('浦发', 10)), [('stock', '600000')])
+            self.index.search('浦发', 10)
+        build.assert_called_once()
+
+    def test_snapshot_is_swapped_in_background(self):
+        with mock.patch.object(self.index, 'build', return_value=make_snapshot()):
+            self.index.search('浦发', 10)
+
+        new_snapshot = make_snapshot(STOCKS + [('601166', '兴业银行', 'SH')])
+        release = threading.Event()
+
+        def slow_build():
+            release.wait(5)
+            return new_snapshot
+
+        self.generation.return_value = 2
+        self.index._checked_at = 0.0
+        with mock.patch.object(self.index, 'build', side_effect=slow_build) as build:
+            # 重建进行中，请求不等待，继续使用旧索引
+            self.assertEqual(self.index.search('兴业', 10), [])
+            self.assertEqual(self.index.search('兴业', 10), [])
+            release.set()
+            self.index._refresh_thread.join(5)
+
+        build.assert_called_once()
+        self.assertEqual(names(self.index.search('兴业', 10)), [('stock', '601166')])
+        self.assertEqual(self.index._generation, 2)
+
+    def test_unchanged_generation_keeps_snapshot(self):
+        with mock.patch.object(self.index, 'build', return_value=make_snapshot()) as build:
+            self.index.search('浦发', 10)
+            self.index._checked_at = 0.0
+            self.index.search('浦发', 10)
+        build.assert_called_once()
+        self.assertIsNone(self.index._refresh_thread)
@@ -0,0 +1,185 @@
+from datetime import date
+from decimal import Decimal
+from unittest import mock
+
+from django.test import TestCase
+
+from stocks.apps.market.models import (
+    CrawlFingerprint, StockHistoryRollup, StockTraderRollup, TopList, TopListDetail
+)
+from stocks.apps.market.spiders import TopListSpider, content_hash, to_amount
+
+TRADE_DATE = date(2024, 3, 11)
+ROW_TEXTS = ['2024-03-11', '600000', '浦发银行', '涨幅偏离值达7%', '10.01%', '5.25%', '1234.5678', '234.5678', '']
+# 同一股票同一天因另一原因再次上榜
+SECOND_ROW_TEXTS = ['2024-03-11', '600000', '浦发银行', '连续三个交易日累计偏离20%', '10.01%', '9.80%', '3000.00', '1000.00', '']
+
+
+def make_cells(texts):
+    cells = [mock.Mock(text=text) for text in texts] + [mock.Mock()]
+    return cells
+
+
+class ParseHelpersTests(TestCase):
+    def test_to_amount_converts_before_rounding(self):
+        self.assertEqual(to_amount('1234.5678'), Decimal('12345678.00'))
+        self.assertEqual(to_amount('0.123456'), Decimal('1234.56'))
+
+
+class SaveRowTests(TestCase):
+    def setUp(self):
+        self.spider = TopListSpider()
+
+    def details(self):
+        return [
+            (d.trader_name, d.trader_type, d.amount, d.proportion)
+            for d in TopListDetail.objects.order_by('trader_type', 'trader_name')
+        ]
+
+    def week_rollup(self):
+        return StockHistoryRollup.objects.get(period='week', bucket_start=TRADE_DATE)
+
+    def test_new_row_creates_records_and_rollups(self):
+        self.spider.save_row(ROW_TEXTS, [
+            ('A营业部', 'buy', Decimal('8000000.00'), Decimal('10.00')),
+            ('B营业部', 'sell', Decimal('2000000.00'), Decimal('3.00')),
+        ])
+
+        top_list = TopList.objects.get()
+        self.assertEqual(top_list.total_buy, Decimal('12345678.00'))
+        self.assertEqual(top_list.total_sell, Decimal('2345678.00'))
+        self.assertEqual(len(self.details()), 2)
+        self.assertEqual(self.week_rollup().appearance_count, 1)
+        self.assertEqual(self.week_rollup().total_buy, Decimal('12345678.00'))
+
+    def test_detail_diff_adds_and_removes_only_changed_rows(self):
+        self.spider.save_row(ROW_TEXTS, [
+            ('A营业部', 'buy', Decimal('8000000.00'), Decimal('10.00')),
+            ('B营业部', 'sell', Decimal('2000000.00'), Decimal('3.00')),
+        ])
+        kept_id = TopListDetail.objects.get(trader_name='A营业部').id
+
+        self.spider.save_row(ROW_TEXTS, [
+            ('A营业部', 'buy', Decimal('8000000.00'), Decimal('10.00')),
+            ('C营业部', 'sell', Decimal('1000000.00'), Decimal('1.50')),
+        ])
+
+        self.assertEqual(self.details(), [
+            ('A营业部', 'buy', Decimal('8000000.00'), Decimal('10.00')),
+            ('C营业部', 'sell', Decimal('1000000.00'), Decimal('1.50')),
+        ])
+        self.assertEqual(TopListDetail.objects.get(trader_name='A营业部').id, kept_id)
+        self.assertEqual(TopList.objects.count(), 1)
+
+    def test_rollups_reflect_changed_recrawl(self):
+        self.spider.save_row(ROW_TEXTS, [('A营业部', 'buy', Decimal('8000000.00'), Decimal('10.00'))])
+
+        changed = list(ROW_TEXTS)
+        changed[6] = '2000.00'
+        self.spider.save_row(changed, [('B营业部', 'buy', Decimal('9000000.00'), Decimal('11.00'))])
+
+        rollup = self.week_rollup()
+        self.assertEqual(rollup.appearance_count, 1)
+        self.assertEqual(rollup.total_buy, Decimal('20000000.00'))
+        self.assertEqual(rollup.total_sell, Decimal('2345678.00'))
+        self.assertEqual(rollup.net_amount, Decimal('17654322.00'))
+        self.assertEqual(rollup.top_traders, [{'trader_name': 'B营业部', 'net_amount': '9000000.00'}])
+
+    def test_identical_seat_rows_survive_same_content_recrawl(self):
+        details = [
+            ('机构专用', 'buy', Decimal('5000000.00'), Decimal('5.00')),
+            ('机构专用', 'buy', Decimal('5000000.00'), Decimal('5.00')),
+        ]
+        self.spider.save_row(ROW_TEXTS, details)
+        ids = set(TopListDetail.objects.values_list('id', flat=True))
+
+        self.spider.save_row(ROW_TEXTS, details)
+
+        self.assertEqual(set(TopListDetail.objects.values_list('id', flat=True)), ids)
+        trader_rollup = StockTraderRollup.objects.get(period='week', trader_name='机构专用')
+        self.assertEqual(trader_rollup.buy_amount, Decimal('10000000.00'))
+
+        self.spider.save_row(ROW_TEXTS, details[:1])
+
+        self.assertEqual(TopListDetail.objects.count(), 1)
+        trader_rollup.refresh_from_db()
+        self.assertEqual(trader_rollup.buy_amount, Decimal('5000000.00'))
+
+    def test_rows_with_different_reasons_are_kept_apart(self):
+        self.spider.save_row(ROW_TEXTS, [('A营业部', 'buy', Decimal('8000000.00'), Decimal('10.00'))])
+        self.spider.save_row(SECOND_ROW_TEXTS, [('B营业部', 'buy', Decimal('9000000.00'), Decimal('11.00'))])
+
+        first = TopList.objects.get(reason=ROW_TEXTS[3])
+        second = TopList.objects.get(reason=SECOND_ROW_TEXTS[3])
+        self.assertEqual(first.total_buy, Decimal('12345678.00'))
+        self.assertEqual(second.total_buy, Decimal('30000000.00'))
+        self.assertEqual(list(first.details.values_list('trader_name', flat=True)), ['A营业部'])
+        self.assertEqual(list(second.details.values_list('trader_name', flat=True)), ['B营业部'])
+        self.assertEqual(self.week_rollup().appearance_count, 2)
+
+    def test_unchanged_details_keep_existing_rows(self):
+        self.spider.save_row(ROW_TEXTS, [('A营业部', 'buy', Decimal('8000000.00'), Decimal('10.00'))])
+
+        changed = list(ROW_TEXTS)
+        changed[5] = '6.00%'
+        self.spider.save_row(changed, None)
+
+        self.assertEqual(TopList.objects.get().turnover, Decimal('6.00'))
+        self.assertEqual(len(self.details()), 1)
+        self.assertEqual(self.week_rollup().turnover_sum, Decimal('6.00'))
+        self.assertEqual(self.week_rollup().top_traders, [{'trader_name': 'A营业部', 'net_amount': '8000000.00'}])
+
+
+class ParseRowTests(TestCase):
+    def setUp(self):
+        self.spider = TopListSpider()
+        self.driver = mock.Mock()
+        self.driver.find_elements.return_value = [mock.Mock(text='明细')]
+
+    def test_unchanged_row_is_skipped_without_opening_details(self):
+        CrawlFingerprint.objects.create(
+            date=TRADE_DATE, stock_code='600000', reason=ROW_TEXTS[3],
+            row_hash=content_hash('\t'.join(ROW_TEXTS)), detail_hash='known'
+        )
+        cells = make_cells(ROW_TEXTS)
+
+        self.assertFalse(self.spider.parse_row(self.driver, cells))
+        cells[9].find_element.assert_not_called()
+        self.driver.back.assert_not_called()
+        self.assertFalse(TopList.objects.exists())
+
+    def test_second_row_for_same_stock_and_day_is_skipped_independently(self):
+        for texts in (ROW_TEXTS, SECOND_ROW_TEXTS):
+            CrawlFingerprint.objects.create(
+                date=TRADE_DATE, stock_code='600000', reason=texts[3],
+                row_hash=content_hash('\t'.join(texts)), detail_hash='known'
+            )
+
+        self.assertFalse(self.spider.parse_row(self.driver, make_cells(ROW_TEXTS)))
+        self.assertFalse(self.spider.parse_row(self.driver, make_cells(SECOND_ROW_TEXTS)))
+        self.assertEqual(CrawlFingerprint.objects.count(), 2)
+
+    def test_changed_row_is_parsed_and_fingerprinted(self):
+        cells = make_cells(ROW_TEXTS)
+        with mock.patch.object(
+            TopListSpider, 'parse_details',
+            side_effect=[[('A营业部', 'buy', Decimal('8000000.00'), Decimal('10.00'))], []]
+        ):
+            self.assertTrue(self.spider.parse_row(self.driver, cells))
+
+        fingerprint = CrawlFingerprint.objects.get(date=TRADE_DATE, stock_code='600000', reason=ROW_TEXTS[3])
+        self.assertEqual(fingerprint.row_hash, content_hash('\t'.join(ROW_TEXTS)))
+        self.assertEqual(fingerprint.detail_hash, content_hash('明细'))
+        self.assertEqual(TopListDetail.objects.count(), 1)
+
+    def test_unchanged_details_are_not_reparsed(self):
+        self.spider.save_row(ROW_TEXTS, [('A营业部', 'buy', Decimal('8000000.00'), Decimal('10.00'))])
+        CrawlFingerprint.objects.create(
+            date=TRADE_DATE, stock_code='600000', reason=ROW_TEXTS[3],
+            row_hash='stale', detail_hash=content_hash('明细')
+        )
+
+        with mock.patch.object(TopListSpider, 'parse_details') as parse_details:
+            self.assertTrue(self.spider.parse_row(self.driver, make_cells(ROW_TEXTS)))
+        parse_details.assert_not_called()
+        self.assertEqual(TopListDetail.objects.count(), 1)
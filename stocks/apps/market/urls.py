@@ -3,6 +3,8 @@ from . import views
 
 urlpatterns = [
     path('stocks/', views.stock_list, name='stock_list'),
+    path('stocks/<str:code>/history/', views.stock_history, name='stock_history'),
+    path('search/', views.search, name='search'),
     path('top-list/', views.top_list, name='top_list'),
     path('top-list/<int:top_list_id>/detail/', views.top_list_detail, name='top_list_detail'),
     path('trader/analysis/', views.trader_analysis, name='trader_analysis'),
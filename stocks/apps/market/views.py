@@ -1,17 +1,83 @@
 from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods
-from django.core.cache import cache
-from django.db.models import Q, F, Sum, Avg
+from django.db.models import Q, F, Sum, Avg, Count
 from django.utils import timezone
 from datetime import timedelta
-from .models import Stock, TopList, TopListDetail, TraderAnalysis
+from .archive import read_archived
+from .caching import single_flight_cache
+from .models import Stock, StockHistoryRollup, TopList, TopListDetail, TraderAnalysis
+from .responses import market_response
+from .search import search_index
 from stocks.apps.users.views import token_required
+from stocks.db_router import read_from_replica
 
+# 归档文件列名到trader_history输出字段的映射
+ARCHIVED_HISTORY_COLUMNS = {
+    'date': 'top_list__date',
+    'stock_code': 'top_list__stock__code',
+    'stock_name': 'top_list__stock__name',
+    'trader_type': 'trader_type',
+    'amount': 'amount',
+    'proportion': 'proportion',
+    'price_change': 'top_list__price_change',
+}
+
+def parse_limit(request, default, maximum):
+    """解析limit参数并限制在[1, maximum]范围内，非数字时返回None"""
+    try:
+        limit = int(request.GET.get('limit', default))
+    except ValueError:
+        return None
+    return max(1, min(limit, maximum))
+
+@read_from_replica
 @require_http_methods(['GET'])
 def stock_list(request):
     stocks = Stock.objects.filter(is_active=True).values('code', 'name', 'market')
-    return JsonResponse({'stocks': list(stocks)})
+    return market_response(request, {'stocks': list(stocks)}, rows_key='stocks')
+
+@read_from_replica
+@require_http_methods(['GET'])
+def stock_history(request, code):
+    """个股龙虎榜历史，按日/周/月汇总"""
+    period = request.GET.get('period', 'day')
+    if period not in dict(StockHistoryRollup.PERIOD_CHOICES):
+        return JsonResponse({'error': '无效的统计周期'}, status=400)
+    limit = parse_limit(request, default=30, maximum=365)
+    if limit is None:
+        return JsonResponse({'error': '无效的limit参数'}, status=400)
+    
+    stock = Stock.objects.filter(code=code).values('id', 'code', 'name', 'market').first()
+    if not stock:
+        return JsonResponse({'error': '股票不存在'}, status=404)
+    
+    rollups = StockHistoryRollup.objects.filter(
+        stock_id=stock.pop('id'),
+        period=period
+    ).order_by('-bucket_start').values(
+        'bucket_start', 'appearance_count', 'total_buy', 'total_sell',
+        'net_amount', 'turnover_sum', 'top_traders'
+    )[:limit]
+    
+    history = []
+    for rollup in rollups:
+        turnover_sum = rollup.pop('turnover_sum')
+        count = rollup['appearance_count']
+        rollup['avg_turnover'] = round(turnover_sum / count, 2) if count else 0
+        history.append(rollup)
+    
+    return market_response(request, {'stock': stock, 'period': period, 'history': history}, rows_key='history')
+
+@require_http_methods(['GET'])
+def search(request):
+    """股票代码/名称/拼音首字母及营业部名称搜索"""
+    query = request.GET.get('q', '')
+    limit = parse_limit(request, default=10, maximum=50)
+    if limit is None:
+        return JsonResponse({'error': '无效的limit参数'}, status=400)
+    return market_response(request, {'results': search_index.search(query, limit)}, rows_key='results')
 
+@read_from_replica
 @require_http_methods(['GET'])
 def top_list(request):
     date = request.GET.get('date')
@@ -28,23 +94,22 @@ def top_list(request):
         'total_buy', 'total_sell', 'net_amount', 'turnover', 'price_change'
     )[:50]
     
-    return JsonResponse({'top_lists': list(top_lists)})
+    return market_response(request, {'top_lists': list(top_lists)}, rows_key='top_lists')
+
+@single_flight_cache(lambda top_list_id: f'top_list_detail_{top_list_id}', timeout=300)  # 缓存5分钟
+def _top_list_detail(top_list_id):
+    details = TopListDetail.objects.filter(top_list_id=top_list_id).values(
+        'trader_name', 'trader_type', 'amount', 'proportion'
+    )
+    return list(details)
 
+@read_from_replica
 @require_http_methods(['GET'])
 def top_list_detail(request, top_list_id):
-    cache_key = f'top_list_detail_{top_list_id}'
-    details = cache.get(cache_key)
-    
-    if not details:
-        details = TopListDetail.objects.filter(top_list_id=top_list_id).values(
-            'trader_name', 'trader_type', 'amount', 'proportion'
-        )
-        details = list(details)
-        cache.set(cache_key, details, 300)  # 缓存5分钟
-    
-    return JsonResponse({'details': details})
+    return market_response(request, {'details': _top_list_detail(top_list_id)}, rows_key='details')
 
 @token_required
+@read_from_replica
 @require_http_methods(['GET'])
 def trader_analysis(request):
     """游资分析接口（仅VIP用户可访问）"""
@@ -65,9 +130,10 @@ def trader_analysis(request):
         'net_amount', 'success_rate', 'appearance_count'
     ).order_by('-appearance_count')[:100]
     
-    return JsonResponse({'analysis': list(analysis)})
+    return market_response(request, {'analysis': list(analysis)}, rows_key='analysis')
 
 @token_required
+@read_from_replica
 @require_http_methods(['GET'])
 def trader_history(request, trader_name):
     """游资历史交易记录（仅VIP用户可访问）"""
@@ -84,44 +150,51 @@ def trader_history(request, trader_name):
         'top_list__date', 'top_list__stock__code', 'top_list__stock__name',
         'trader_type', 'amount', 'proportion', 'top_list__price_change'
     ).order_by('-top_list__date')
+    history = list(history)
+    
+    # 查询范围超出热数据期限时，补充读取已归档的记录
+    archived = read_archived(
+        start_date,
+        columns=list(ARCHIVED_HISTORY_COLUMNS),
+        filters=[('trader_name', '=', trader_name)]
+    )
+    archived.sort(key=lambda row: row['date'], reverse=True)
+    history.extend(
+        {ARCHIVED_HISTORY_COLUMNS[column]: value for column, value in row.items()} for row in archived
+    )
     
-    return JsonResponse({'history': list(history)})
+    return market_response(request, {'history': history}, rows_key='history')
 
+@single_flight_cache(lambda date: f'market_overview_{date}', timeout=3600)  # 缓存1小时
+def _market_overview(date):
+    # 计算当日市场资金流向数据
+    daily_stats = TopList.objects.filter(date=date).aggregate(
+        total_buy_amount=Sum('total_buy'),
+        total_sell_amount=Sum('total_sell'),
+        net_amount=Sum('net_amount'),
+        avg_turnover=Avg('turnover'),
+        stock_count=Count('id')
+    )
+    
+    # 按交易所分组统计
+    market_stats = TopList.objects.filter(date=date).values(
+        'stock__market'
+    ).annotate(
+        buy_amount=Sum('total_buy'),
+        sell_amount=Sum('total_sell'),
+        net_flow=Sum('net_amount'),
+        stock_count=Count('id')
+    )
+    
+    return {
+        'date': date,
+        'daily_stats': daily_stats,
+        'market_stats': list(market_stats)
+    }
+
+@read_from_replica
 @require_http_methods(['GET'])
 def market_overview(request):
     """市场资金流向概览"""
     date = request.GET.get('date', timezone.now().date().isoformat())
-    
-    # 从缓存获取数据
-    cache_key = f'market_overview_{date}'
-    overview = cache.get(cache_key)
-    
-    if not overview:
-        # 计算当日市场资金流向数据
-        daily_stats = TopList.objects.filter(date=date).aggregate(
-            total_buy_amount=Sum('total_buy'),
-            total_sell_amount=Sum('total_sell'),
-            net_amount=Sum('net_amount'),
-            avg_turnover=Avg('turnover'),
-            stock_count=models.Count('id')
-        )
-        
-        # 按交易所分组统计
-        market_stats = TopList.objects.filter(date=date).values(
-            'stock__market'
-        ).annotate(
-            buy_amount=Sum('total_buy'),
-            sell_amount=Sum('total_sell'),
-            net_flow=Sum('net_amount'),
-            stock_count=models.Count('id')
-        )
-        
-        overview = {
-            'date': date,
-            'daily_stats': daily_stats,
-            'market_stats': list(market_stats)
-        }
-        
-        cache.set(cache_key, overview, 3600)  # 缓存1小时
-    
-    return JsonResponse(overview)
\ No newline at end of file
+    return market_response(request, _market_overview(date))
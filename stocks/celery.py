@@ -11,6 +11,15 @@ app = Celery('stocks')
 # Load task modules from all registered Django app configs.
 app.config_from_object('django.conf:settings', namespace='CELERY')
 
+# Apply per-queue worker settings, e.g.
+#   CELERY_WORKER_PROFILE=crawl celery -A stocks worker -Q crawl
+profile = os.environ.get('CELERY_WORKER_PROFILE')
+if profile:
+    worker_settings = settings.WORKER_PROFILES[profile]
+    app.conf.worker_concurrency = worker_settings['concurrency']
+    app.conf.worker_prefetch_multiplier = worker_settings['prefetch_multiplier']
+    app.conf.worker_max_tasks_per_child = worker_settings['max_tasks_per_child']
+
 # Auto-discover tasks in all installed apps
 app.autodiscover_tasks(lambda: settings.INSTALLED_APPS)
 
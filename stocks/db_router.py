@@ -0,0 +1,79 @@
+"""主从数据库路由：只读的行情/分析查询走从库，写操作始终走主库"""
+
+import functools
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+
+PRIMARY_DB = 'default'
+REPLICA_DB = 'replica'
+
+# 当前上下文是否允许读从库，以及是否因写操作而被固定到主库
+_use_replica = ContextVar('use_replica', default=False)
+_sticky = ContextVar('sticky', default=True)
+_pinned = ContextVar('pinned', default=False)
+
+
+def replica_available():
+    return REPLICA_DB in settings.DATABASES
+
+
+@contextmanager
+def use_replica(sticky=True):
+    """在此上下文内的读操作走从库。
+
+    sticky为True时，一旦发生写操作，之后的读取回到主库（read-your-writes）；
+    批量分析任务读写互不依赖，可以传入sticky=False。
+    """
+    tokens = (_use_replica.set(True), _sticky.set(sticky), _pinned.set(False))
+    try:
+        yield
+    finally:
+        for var, token in zip((_use_replica, _sticky, _pinned), tokens):
+            var.reset(token)
+
+
+@contextmanager
+def use_primary():
+    """强制此上下文内的读操作走主库"""
+    token = _use_replica.set(False)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def read_from_replica(view_func):
+    """视图装饰器：只读视图的查询走从库"""
+    if iscoroutinefunction(view_func):
+        @functools.wraps(view_func)
+        async def async_wrapper(request, *args, **kwargs):
+            with use_replica():
+                return await view_func(request, *args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        with use_replica():
+            return view_func(request, *args, **kwargs)
+    return wrapper
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _use_replica.get() and not _pinned.get() and replica_available():
+            return REPLICA_DB
+        return PRIMARY_DB
+
+    def db_for_write(self, model, **hints):
+        if _use_replica.get() and _sticky.get():
+            _pinned.set(True)
+        return PRIMARY_DB
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY_DB
@@ -71,9 +71,27 @@ DATABASES = {
         'PASSWORD': env('DB_PASSWORD'),
         'HOST': env('DB_HOST'),
         'PORT': env('DB_PORT'),
+        # 持久连接：连接在请求间复用，复用前做健康检查
+        'CONN_MAX_AGE': env.int('DB_CONN_MAX_AGE', default=60),
+        'CONN_HEALTH_CHECKS': env.bool('DB_CONN_HEALTH_CHECKS', default=True),
     }
 }
 
+# 可选只读从库：配置DB_REPLICA_HOST后启用，未配置时所有查询走主库
+if env('DB_REPLICA_HOST', default=''):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': env('DB_REPLICA_NAME', default=DATABASES['default']['NAME']),
+        'USER': env('DB_REPLICA_USER', default=DATABASES['default']['USER']),
+        'PASSWORD': env('DB_REPLICA_PASSWORD', default=DATABASES['default']['PASSWORD']),
+        'HOST': env('DB_REPLICA_HOST'),
+        'PORT': env('DB_REPLICA_PORT', default=DATABASES['default']['PORT']),
+        # 测试时从库指向主库的测试数据库，不单独建库迁移
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['stocks.db_router.PrimaryReplicaRouter']
+
 # Redis Cache
 CACHES = {
     'default': {
@@ -85,6 +103,9 @@ CACHES = {
     }
 }
 
+# 行情接口中Decimal字段的输出格式：'string'输出为定点小数字符串（与原有接口一致），'number'输出为数值
+MARKET_DECIMAL_FORMAT = env('MARKET_DECIMAL_FORMAT', default='string')
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -108,6 +129,10 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 MEDIA_URL = 'media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# 冷数据归档：早于ARCHIVE_AFTER_DAYS天的龙虎榜数据写入ARCHIVE_ROOT下的Parquet文件
+ARCHIVE_ROOT = env('ARCHIVE_ROOT', default=os.path.join(BASE_DIR, 'archive'))
+ARCHIVE_AFTER_DAYS = env.int('ARCHIVE_AFTER_DAYS', default=90)
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -123,6 +148,34 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 
+# 爬虫和分析任务使用独立队列，分别由不同配置的worker消费
+CELERY_TASK_DEFAULT_QUEUE = 'analytics'
+CELERY_TASK_ROUTES = {
+    'stocks.apps.market.tasks.crawl_toplist_data': {'queue': 'crawl'},
+    'stocks.apps.market.tasks.schedule_crawl_toplist': {'queue': 'crawl'},
+    'stocks.apps.market.tasks.update_trader_analysis': {'queue': 'analytics'},
+    'stocks.apps.market.tasks.schedule_update_analysis': {'queue': 'analytics'},
+    'stocks.apps.market.tasks.rebuild_stock_rollups': {'queue': 'analytics'},
+    'stocks.apps.market.tasks.archive_old_data': {'queue': 'analytics'},
+}
+
+# worker配置档案，启动worker时通过CELERY_WORKER_PROFILE环境变量选择
+WORKER_PROFILES = {
+    'crawl': {
+        'concurrency': env.int('CELERY_CRAWL_CONCURRENCY', default=1),
+        'prefetch_multiplier': env.int('CELERY_CRAWL_PREFETCH', default=1),
+        'max_tasks_per_child': env.int('CELERY_CRAWL_MAX_TASKS_PER_CHILD', default=1),
+    },
+    'analytics': {
+        'concurrency': env.int('CELERY_ANALYTICS_CONCURRENCY', default=4),
+        'prefetch_multiplier': env.int('CELERY_ANALYTICS_PREFETCH', default=4),
+        'max_tasks_per_child': env.int('CELERY_ANALYTICS_MAX_TASKS_PER_CHILD', default=100),
+    },
+}
+
+# 单次爬虫子进程的最长运行时间（秒）
+CRAWL_TIMEOUT = env.int('CRAWL_TIMEOUT', default=1800)
+
 # JWT settings
 JWT_SECRET_KEY = SECRET_KEY
 JWT_ALGORITHM = 'HS256'
@@ -6,4 +6,9 @@ from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'stocks.settings')
 
-application = get_wsgi_application()
\ No newline at end of file
+application = get_wsgi_application()
+
+# 预先构建搜索索引，避免首个搜索请求承担构建开销
+from stocks.apps.market.search import warm_up  # noqa: E402
+
+warm_up()